@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+In-process load test for the Animal & File API (main.py)
+
+Drives the FastAPI app through httpx's ASGI transport (no sockets) against a
+throwaway data directory, seeding the stored history at each requested size
+and measuring each endpoint at several concurrency levels.
+
+Usage:
+    pip install httpx
+    python benchmarks/bench_api.py --sizes 0,10000,100000 --concurrency 1,16,64
+
+Results are printed as a table and written to benchmarks/results/ as JSON so
+runs can be compared over time.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+ANIMALS = ["cat", "dog", "elephant"]
+FILES_PER_ANIMAL = 10
+
+
+def build_scenarios(upload_bytes):
+    payload = os.urandom(upload_bytes)
+    counter = iter(range(10 ** 12))
+
+    def upload():
+        # Unique content per request so every upload writes a new blob
+        body = next(counter).to_bytes(8, "big") + payload
+        return {"files": {"file": (f"bench-{len(body)}.bin", body, "application/octet-stream")}}
+
+    # Reads run before writes so they see exactly the seeded history size
+    return {
+        "animal_history": ("GET", "/animal/history", lambda: {}),
+        "animal_history_page": ("GET", "/animal/history", lambda: {"params": {"limit": 100}}),
+        "animal_history_ndjson": ("GET", "/animal/history", lambda: {"params": {"format": "ndjson"}}),
+        "file_history_page": ("GET", "/file/history", lambda: {"params": {"limit": 100}}),
+        "stats": ("GET", "/stats", lambda: {}),
+        "animal_select": ("POST", "/animal/select", lambda: {"json": {"animal": "cat"}}),
+        "animal_select_batch": ("POST", "/animal/select/batch", lambda: {"json": [{"animal": "dog"}] * 100}),
+        "file_upload": ("POST", "/file/upload", upload),
+    }
+
+
+def seed(main, size):
+    """Replace the stored history with ``size`` selections and size/10 file records."""
+    start = datetime(2024, 1, 1)
+    animals = [
+        {"animal": ANIMALS[i % len(ANIMALS)], "timestamp": (start + timedelta(seconds=i)).isoformat()}
+        for i in range(size)
+    ]
+    files = [
+        {
+            "filename": f"seed-{i}.txt",
+            "size": 1024,
+            "content_type": "text/plain",
+            "timestamp": (start + timedelta(seconds=i)).isoformat(),
+            "path": os.path.join(main.UPLOADS_DIR, f"seed-{i}.txt"),
+            "sha256": None,
+        }
+        for i in range(size // FILES_PER_ANIMAL)
+    ]
+    main.save_data({"animals": animals, "files": files})
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, scenario, concurrency, total):
+    method, url, make_kwargs = scenario
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.request(method, url, **make_kwargs())
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run(args, main):
+    scenarios = build_scenarios(args.upload_bytes)
+    selected = args.endpoints.split(",") if args.endpoints else list(scenarios)
+    results = []
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for size in args.sizes:
+            for concurrency in args.concurrency:
+                seed(main, size)
+                for name in selected:
+                    stats = await run_scenario(client, scenarios[name], concurrency, args.requests)
+                    row = {"endpoint": name, "history_size": size, "concurrency": concurrency, **stats}
+                    results.append(row)
+                    print(
+                        f"{name:<22} size={size:<8} c={concurrency:<4} "
+                        f"{stats['throughput_rps']:>9} req/s  p50={stats['p50_ms']:>9}ms  "
+                        f"p95={stats['p95_ms']:>9}ms  p99={stats['p99_ms']:>9}ms  errors={stats['errors']}"
+                    )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value):
+    return [int(part) for part in value.split(",") if part]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Animal & File API in-process")
+    parser.add_argument("--sizes", type=int_list, default=[0, 1000, 10000], help="history sizes to seed, e.g. 0,10000")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 16], help="concurrent clients, e.g. 1,16,64")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint/size/concurrency")
+    parser.add_argument("--endpoints", help="comma-separated subset of scenarios to run")
+    parser.add_argument("--upload-bytes", type=int, default=64 * 1024, help="payload size for file_upload")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "json"], help="STORAGE_BACKEND to test")
+    parser.add_argument("--write-behind-ms", type=int, default=0, help="ANIMAL_WRITE_BEHIND_MS to test")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    output = Path(args.output) if args.output else (
+        REPO_DIR / "benchmarks" / "results" / f"api-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+
+    # main.py resolves its data files relative to the working directory at import time
+    workdir = tempfile.mkdtemp(prefix="bench-api-")
+    os.chdir(workdir)
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["ANIMAL_WRITE_BEHIND_MS"] = str(args.write_behind_ms)
+    sys.path.insert(0, str(REPO_DIR))
+    import main as api
+
+    results = asyncio.run(run(args, api))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "write_behind_ms": args.write_behind_ms,
+            "requests_per_run": args.requests,
+            "upload_bytes": args.upload_bytes,
+            "workdir": workdir,
+        },
+        "results": results,
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
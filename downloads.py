@@ -0,0 +1,144 @@
+"""
+File download responses for the Animal & File API.
+
+Adds what Starlette's ``FileResponse`` lacks here: single byte-range requests
+(``Range`` / ``If-Range``), strong ETags and ``304 Not Modified`` handling.
+Bodies are handed to the server with the ASGI zero-copy extension
+(``sendfile``) when it is advertised, and streamed in chunks otherwise.
+"""
+
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+import anyio
+from starlette.responses import FileResponse, Response
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """Return ``(start, end)`` (inclusive) for a single ``bytes=`` range.
+
+    ``None`` means the header should be ignored and the whole file sent,
+    which is what we do for malformed and multi-range requests.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, sep, end = header[len("bytes="):].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start:
+            start = int(start)
+            end = int(end) if end else size - 1
+        else:
+            # suffix range: the last N bytes
+            start, end = max(size - int(end), 0), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in tags or etag in [tag[2:] for tag in tags if tag.startswith("W/")]
+
+
+def not_modified_since(header, mtime):
+    if not header:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+class FileRangeResponse(FileResponse):
+    def __init__(self, path, stat_result, byte_range=None, **kwargs):
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        size = stat_result.st_size
+        self.byte_range = byte_range or (0, size - 1)
+        start, end = self.byte_range
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["content-length"] = str(end - start + 1)
+        if byte_range:
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        start, end = self.byte_range
+        count = end - start + 1
+        if self.send_header_only or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f.fileno(),
+                    "offset": start,
+                    "count": count,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as f:
+                await f.seek(start)
+                while count > 0:
+                    chunk = await f.read(min(self.chunk_size, count))
+                    if not chunk:
+                        break
+                    count -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+                if count > 0:
+                    # file shrank underneath us; end the response rather than hang
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def file_response(request, path, etag, media_type=None, filename=None):
+    """Build a 200/206/304/416 response for ``path`` honouring conditional headers."""
+    stat_result = os.stat(path)
+    if etag is None:
+        etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    validators = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag) or (
+        not if_none_match and not_modified_since(request.headers.get("if-modified-since"), stat_result.st_mtime)
+    ):
+        return Response(status_code=304, headers=validators)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    # If-Range requires a strong validator; fall back to the full body when it doesn't match
+    if not if_range or if_range == etag or if_range == validators["last-modified"]:
+        try:
+            byte_range = parse_range(request.headers.get("range"), stat_result.st_size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={"content-range": f"bytes */{stat_result.st_size}", **validators},
+            )
+
+    return FileRangeResponse(
+        path,
+        stat_result,
+        byte_range=byte_range,
+        headers=validators,
+        media_type=media_type,
+        filename=filename,
+        method=request.method,
+    )
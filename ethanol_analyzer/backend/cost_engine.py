@@ -0,0 +1,148 @@
+"""
+Deterministic fuel cost model for ethanol blends
+Vectorized with NumPy so a whole fleet is priced in one pass
+"""
+
+import re
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# Retail petrol (E10, the nationwide pump fuel) price in ₹/litre by state
+# capital, used as the baseline every blend is compared against. Keys are
+# the state_key() form of the state name.
+PETROL_PRICE_BY_STATE = {
+    "andhra_pradesh": 109.6,
+    "assam": 96.5,
+    "bihar": 105.2,
+    "chhattisgarh": 100.4,
+    "delhi": 94.7,
+    "goa": 96.4,
+    "gujarat": 94.5,
+    "haryana": 95.0,
+    "himachal_pradesh": 95.0,
+    "jharkhand": 97.8,
+    "karnataka": 102.9,
+    "kerala": 107.5,
+    "madhya_pradesh": 106.5,
+    "maharashtra": 104.2,
+    "manipur": 99.0,
+    "meghalaya": 96.0,
+    "mizoram": 94.3,
+    "nagaland": 97.5,
+    "odisha": 101.0,
+    "punjab": 97.0,
+    "rajasthan": 104.9,
+    "tamil_nadu": 100.8,
+    "telangana": 107.4,
+    "tripura": 97.5,
+    "uttar_pradesh": 94.6,
+    "uttarakhand": 93.5,
+    "west_bengal": 103.9,
+}
+
+BLENDS = ("E10", "E15", "E20")
+
+# Pump price of each blend relative to E10.
+BLEND_PRICE_FACTOR = np.array([1.0, 0.995, 0.99])
+
+# Vehicle groups by the blend their fuel system was calibrated for.
+TIERS = ("e20_ready", "e10_ready", "legacy")
+E20_READY_FROM_YEAR = 2023
+E10_READY_FROM_YEAR = 2010
+
+# Fuel efficiency lost relative to E10, per blend (rows) and tier (columns).
+# Ethanol carries about a third less energy per litre than petrol; vehicles
+# calibrated for higher blends recover part of that.
+EFFICIENCY_LOSS = np.array([
+    [0.0, 0.0, 0.0],
+    [0.01, 0.02, 0.035],
+    [0.015, 0.04, 0.065],
+])
+
+
+def blend_index(blend: str) -> int:
+    """Row of a blend name like "e20" in the blend tables; ValueError if unknown"""
+    name = blend.strip().upper()
+    if name not in BLENDS:
+        raise ValueError(f"Unknown ethanol blend {blend!r}; expected one of {', '.join(BLENDS)}")
+    return BLENDS.index(name)
+
+
+def state_key(state: str) -> str:
+    """Key of a state name like "Tamil Nadu" in PETROL_PRICE_BY_STATE; ValueError if unknown"""
+    key = "_".join(re.sub(r'[^a-z0-9]+', ' ', state.lower()).split())
+    if key not in PETROL_PRICE_BY_STATE:
+        raise ValueError(f"Unknown state {state!r}; no petrol price for it")
+    return key
+
+
+def vehicle_tiers(years: np.ndarray) -> np.ndarray:
+    """Tier index (see TIERS) for each model year"""
+    return np.where(years >= E20_READY_FROM_YEAR, 0, np.where(years >= E10_READY_FROM_YEAR, 1, 2))
+
+
+def cost_impact(
+    monthly_spend: Sequence[float],
+    states: Sequence[str],
+    blends: Sequence[str],
+    years: Sequence[int],
+) -> Dict[str, np.ndarray]:
+    """
+    Monthly and annual cost change of moving each vehicle from E10 to its
+    blend, for the same distance driven. All inputs are equal-length sequences.
+    """
+    spend = np.asarray(monthly_spend, dtype=float)
+    blend_rows = np.array([blend_index(b) for b in blends], dtype=int)
+    tiers = vehicle_tiers(np.asarray(years, dtype=int))
+    prices = np.array([PETROL_PRICE_BY_STATE[state_key(s)] for s in states])
+
+    loss = EFFICIENCY_LOSS[blend_rows, tiers]
+    price_factor = BLEND_PRICE_FACTOR[blend_rows]
+    litres = spend / prices
+    new_litres = litres / (1 - loss)
+    new_spend = new_litres * prices * price_factor
+    monthly_change = new_spend - spend
+
+    return {
+        "fuel_price": prices,
+        "blend_price": prices * price_factor,
+        "efficiency_change_pct": 0.0 - loss * 100,
+        "monthly_litres": litres,
+        "new_monthly_litres": new_litres,
+        "new_monthly_spend": new_spend,
+        "monthly_change": monthly_change,
+        "annual_change": monthly_change * 12,
+        "tier": tiers,
+    }
+
+
+def impact_rows(impact: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Per-vehicle dicts of rounded figures from a cost_impact() result"""
+    monthly_change = np.round(impact["monthly_change"]).astype(int)
+    columns = {
+        "fuel_price": np.round(impact["fuel_price"], 2),
+        "blend_price": np.round(impact["blend_price"], 2),
+        "efficiency_change_pct": np.round(impact["efficiency_change_pct"], 1),
+        "monthly_litres": np.round(impact["monthly_litres"], 1),
+        "new_monthly_litres": np.round(impact["new_monthly_litres"], 1),
+        "new_monthly_spend": np.round(impact["new_monthly_spend"]).astype(int),
+        "monthly_change": monthly_change,
+        # From the rounded monthly figure so the two always agree
+        "annual_change": monthly_change * 12,
+    }
+    tiers = [TIERS[t] for t in impact["tier"]]
+    lists = {name: values.tolist() for name, values in columns.items()}
+    return [
+        dict({name: values[i] for name, values in lists.items()}, calibration=tiers[i])
+        for i in range(len(tiers))
+    ]
+
+
+def single_impact(monthly_spend: float, state: str, blend: str, year: int) -> Dict[str, Any]:
+    """cost_impact() for one vehicle, as a dict of rounded figures"""
+    return impact_rows(cost_impact([monthly_spend], [state], [blend], [year]))[0]
+
+
+def describe_change(amount: int) -> str:
+    return f"savings ₹{-amount}" if amount < 0 else f"additional ₹{amount}"
@@ -4,18 +4,47 @@ Gemini-Powered Ethanol Analyzer Backend
 Simplified backend that uses Google Gemini AI for all analysis
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import ValidationError
+from typing import Optional, Dict, Any, List
 import google.generativeai as genai
+import google.ai.generativelanguage as glm
+import asyncio
+import csv
+import hashlib
+import io
 import json
 import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 
+try:
+    from backend.cost_engine import blend_index, cost_impact, describe_change, impact_rows, single_impact, state_key
+except ImportError:  # run as a script from inside backend/
+    from cost_engine import blend_index, cost_impact, describe_change, impact_rows, single_impact, state_key
+try:
+    from backend.vehicle_index import VehicleIndex, VehicleSpec, canonical
+except ImportError:
+    from vehicle_index import VehicleIndex, VehicleSpec, canonical
+try:
+    from backend.static_assets import AssetStore, StaticAsset
+except ImportError:
+    from static_assets import AssetStore, StaticAsset
+try:
+    from backend.metrics import InFlightMiddleware, StageMetrics, hit_rate
+except ImportError:
+    from metrics import InFlightMiddleware, StageMetrics, hit_rate
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,35 +64,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files (try to serve static assets)
-try:
-    static_dir = Path(__file__).parent.parent
-    if static_dir.exists():
-        app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
-except Exception as e:
-    logger.warning(f"Could not mount static files: {e}")
+stage_metrics = StageMetrics()
+app.add_middleware(InFlightMiddleware, metrics=stage_metrics)
 
 # Get the parent directory (where index.html is located)
 BASE_DIR = Path(__file__).parent.parent
 
-@app.get("/")
-async def serve_frontend():
+# Possible locations for index.html, in order; FRONTEND_INDEX overrides them
+INDEX_PATHS = [Path(os.environ["FRONTEND_INDEX"])] if os.environ.get("FRONTEND_INDEX") else [
+    BASE_DIR / "index.html",
+    Path("/opt/ethanol_analyzer/index.html"),
+    Path("./index.html"),
+    Path("../index.html")
+]
+# Only files under this directory are served at /static
+STATIC_DIR = Path(os.environ.get("STATIC_DIR", BASE_DIR / "static"))
+
+def load_index_page() -> Optional[StaticAsset]:
+    """Read and precompress index.html once; changes to it need a restart"""
+    for index_path in INDEX_PATHS:
+        if index_path.is_file():
+            asset = StaticAsset("index.html", index_path.read_bytes())
+            logger.info(f"Serving index.html from {index_path} ({asset.size} bytes, encodings: {', '.join(asset.variants)})")
+            return asset
+    logger.error(f"index.html not found. Searched in: {[str(p) for p in INDEX_PATHS]}")
+    return None
+
+index_page = load_index_page()
+static_assets = AssetStore.from_directory(STATIC_DIR)
+if static_assets:
+    logger.info(f"Serving {len(static_assets)} static files from {STATIC_DIR}")
+
+@app.api_route("/", methods=["GET", "HEAD"])
+async def serve_frontend(request: Request):
     """Serve the main frontend application"""
-    # Try multiple possible locations for index.html
-    possible_paths = [
-        BASE_DIR / "index.html",
-        Path("/opt/ethanol_analyzer/index.html"),
-        Path("./index.html"),
-        Path("../index.html")
-    ]
-    
-    for index_path in possible_paths:
-        if index_path.exists():
-            logger.info(f"Found index.html at: {index_path}")
-            return FileResponse(index_path)
-    
-    logger.error(f"index.html not found. Searched in: {[str(p) for p in possible_paths]}")
-    return {"message": "Frontend not found. Please access index.html directly.", "searched_paths": [str(p) for p in possible_paths]}
+    if index_page is None:
+        return {"message": "Frontend not found. Please access index.html directly.", "searched_paths": [str(p) for p in INDEX_PATHS]}
+    return index_page.response(request)
+
+@app.api_route("/static/{name:path}", methods=["GET", "HEAD"])
+async def serve_static(name: str, request: Request):
+    """Serve a file from STATIC_DIR; names containing a content hash are cached as immutable"""
+    asset = static_assets.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return asset.response(request)
 
 # List of Gemini models to try in order of preference
 AVAILABLE_MODELS = [
@@ -77,38 +122,325 @@ AVAILABLE_MODELS = [
     'models/gemini-1.5-pro'
 ]
 
-def get_working_model(api_key: str):
-    """Find and return the first working Gemini model"""
-    genai.configure(api_key=api_key)
-    
-    for model_name in AVAILABLE_MODELS:
+# How long a resolved model is trusted per API key, how long a model that
+# 404'd is skipped, and after how long a cached model is re-probed in the
+# background while still being served.
+MODEL_CACHE_TTL = int(os.environ.get("GEMINI_MODEL_CACHE_TTL", 6 * 3600))
+MODEL_NEGATIVE_TTL = int(os.environ.get("GEMINI_MODEL_NEGATIVE_TTL", 24 * 3600))
+MODEL_REVALIDATE_AFTER = int(os.environ.get("GEMINI_MODEL_REVALIDATE_AFTER", 3600))
+MAX_CACHED_KEYS = 1024
+
+def hash_api_key(api_key: str) -> str:
+    """Stable identifier for an API key that is safe to keep in memory and logs"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+def _is_not_found(error: Exception) -> bool:
+    error_msg = str(error).lower()
+    return "404" in error_msg or "not found" in error_msg
+
+def _is_auth_error(error: Exception) -> bool:
+    error_msg = str(error).lower()
+    return any(marker in error_msg for marker in (
+        "permission", "forbidden", "403", "401", "unauthenticated", "api key not valid", "api_key_invalid"
+    ))
+
+def build_model(api_key: str, model_name: str):
+    """Create a GenerativeModel that always uses this API key"""
+    # GenerativeModel picks up the process-wide default client on first use, so
+    # with genai.configure alone concurrent requests could run on each other's keys
+    gemini_model = genai.GenerativeModel(model_name)
+    gemini_model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    return gemini_model
+
+def probe_model(gemini_model, model_name: str) -> bool:
+    """Send a tiny generation request; True if the model answers"""
+    logger.info(f"Testing model: {model_name}")
+    response = gemini_model.generate_content(
+        "Test",
+        generation_config=genai.types.GenerationConfig(
+            max_output_tokens=10,
+            temperature=0.0
+        )
+    )
+    if response and response.text and len(response.text.strip()) > 0:
+        logger.info(f"Model {model_name} is working - Response: {response.text[:20]}...")
+        return True
+    logger.warning(f"Model {model_name} returned empty response")
+    return False
+
+class ModelCache:
+    """
+    Working Gemini model per API key, so the common path makes no probe calls.
+
+    Keys are stored hashed. Models that 404 for a key are skipped for
+    MODEL_NEGATIVE_TTL. Entries older than MODEL_REVALIDATE_AFTER are still
+    served while a background thread re-probes them, and callers drop an entry
+    with invalidate() when a real call on it fails.
+    """
+
+    def __init__(self, ttl: int, negative_ttl: int, revalidate_after: int, max_keys: int = MAX_CACHED_KEYS):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.revalidate_after = revalidate_after
+        self.max_keys = max_keys
+        self._resolved = OrderedDict()  # key hash -> (model, model name, resolved at)
+        self._unavailable = {}  # (key hash, model name) -> skip until
+        self._key_locks = {}
+        self._revalidating = set()
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        self.counters = {"hits": 0, "misses": 0, "probes": 0, "invalidations": 0}
+
+    def _key_lock(self, key_hash: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key_hash, threading.Lock())
+
+    def _prune(self):
+        """
+        Drop expired entries, lapsed 404 marks and idle per-key locks, so keys
+        that never resolve (bogus ones included) don't accumulate. Runs at most
+        once a minute; the caller holds self._lock.
+        """
+        now = time.monotonic()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        for key_hash in [k for k, entry in self._resolved.items() if now - entry[2] >= self.ttl]:
+            del self._resolved[key_hash]
+        self._unavailable = {k: until for k, until in self._unavailable.items() if until > now}
+        # A lock dropped just before someone acquires it only costs a duplicate probe
+        self._key_locks = {
+            k: lock for k, lock in self._key_locks.items()
+            if lock.locked() or k in self._resolved or k in self._revalidating
+        }
+
+    def _mark_unavailable(self, key_hash: str, model_name: str):
+        """Skip this model for this key for negative_ttl; the caller holds self._lock"""
+        self._unavailable.pop((key_hash, model_name), None)
+        self._unavailable[(key_hash, model_name)] = time.monotonic() + self.negative_ttl
+        # Oldest marks go first once as many keys as max_keys have some
+        while len(self._unavailable) > self.max_keys * len(AVAILABLE_MODELS):
+            del self._unavailable[next(iter(self._unavailable))]
+
+    def _cached(self, key_hash: str):
+        with self._lock:
+            self._prune()
+            entry = self._resolved.get(key_hash)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[2] >= self.ttl:
+                del self._resolved[key_hash]
+                return None
+            self._resolved.move_to_end(key_hash)
+            return entry
+
+    def _resolve(self, api_key: str, key_hash: str):
+        now = time.monotonic()
+        for model_name in AVAILABLE_MODELS:
+            with self._lock:
+                if self._unavailable.get((key_hash, model_name), 0) > now:
+                    continue
+            gemini_model = build_model(api_key, model_name)
+            try:
+                with self._lock:
+                    self.counters["probes"] += 1
+                if not probe_model(gemini_model, model_name):
+                    continue
+            except Exception as e:
+                error_msg = str(e).lower()
+                if _is_not_found(e):
+                    logger.warning(f"Model {model_name} not available (404)")
+                    with self._lock:
+                        self._mark_unavailable(key_hash, model_name)
+                elif _is_auth_error(e):
+                    logger.warning(f"Model {model_name} access denied")
+                else:
+                    logger.warning(f"Model {model_name} failed: {type(e).__name__}: {str(e)}")
+                continue
+            with self._lock:
+                self._resolved[key_hash] = (gemini_model, model_name, time.monotonic())
+                self._resolved.move_to_end(key_hash)
+                while len(self._resolved) > self.max_keys:
+                    self._resolved.popitem(last=False)
+            return gemini_model, model_name
+        raise Exception("No working Gemini model found. Please check your API key and try again.")
+
+    def _revalidate(self, api_key: str, key_hash: str):
         try:
-            logger.info(f"Testing model: {model_name}")
-            test_model = genai.GenerativeModel(model_name)
-            # Simple test prompt with generation config
-            response = test_model.generate_content(
-                "Test", 
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=10,
-                    temperature=0.0
-                )
+            with self._key_lock(key_hash):
+                self._resolve(api_key, key_hash)
+        except Exception as e:
+            # Keep serving the current model; a failing real call will invalidate it
+            logger.warning(f"Background model revalidation failed for key {key_hash}: {e}")
+        finally:
+            with self._lock:
+                self._revalidating.discard(key_hash)
+
+    def get(self, api_key: str):
+        key_hash = hash_api_key(api_key)
+        entry = self._cached(key_hash)
+        if entry is None:
+            # One probe run per key at a time; concurrent callers wait for its result
+            with self._key_lock(key_hash):
+                entry = self._cached(key_hash)
+                if entry is None:
+                    with self._lock:
+                        self.counters["misses"] += 1
+                    return self._resolve(api_key, key_hash)
+        gemini_model, model_name, resolved_at = entry
+        with self._lock:
+            self.counters["hits"] += 1
+            start_revalidation = (
+                time.monotonic() - resolved_at >= self.revalidate_after and key_hash not in self._revalidating
             )
-            if response and response.text and len(response.text.strip()) > 0:
-                logger.info(f"Model {model_name} is working - Response: {response.text[:20]}...")
-                return genai.GenerativeModel(model_name), model_name
-            else:
-                logger.warning(f"Model {model_name} returned empty response")
+            if start_revalidation:
+                self._revalidating.add(key_hash)
+        if start_revalidation:
+            threading.Thread(target=self._revalidate, args=(api_key, key_hash), daemon=True).start()
+        return gemini_model, model_name
+
+    def invalidate(self, api_key: str, model_name: str, error: Optional[Exception] = None):
+        """
+        Forget the cached model for this key after a real call on it failed with
+        a not-found or auth error. Other failures (rate limits, quota, safety
+        blocks) say nothing about the model, so it stays cached.
+        """
+        if error is not None and not (_is_not_found(error) or _is_auth_error(error)):
+            return
+        key_hash = hash_api_key(api_key)
+        with self._lock:
+            entry = self._resolved.get(key_hash)
+            if entry is not None and entry[1] == model_name:
+                del self._resolved[key_hash]
+                self.counters["invalidations"] += 1
+            if error is not None and _is_not_found(error):
+                self._mark_unavailable(key_hash, model_name)
+
+model_cache = ModelCache(MODEL_CACHE_TTL, MODEL_NEGATIVE_TTL, MODEL_REVALIDATE_AFTER)
+
+def get_working_model(api_key: str):
+    """Return a working Gemini model for this API key, probing only on a cache miss"""
+    return model_cache.get(api_key)
+
+# Gemini calls allowed in flight per process and per API key, and how long a
+# request may wait for a slot before giving up.
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", 16))
+GEMINI_PER_KEY_CONCURRENCY = int(os.environ.get("GEMINI_PER_KEY_CONCURRENCY", 2))
+GEMINI_QUEUE_TIMEOUT = float(os.environ.get("GEMINI_QUEUE_TIMEOUT", 30))
+DISCONNECT_POLL_INTERVAL = 0.5
+
+class GeminiBusy(Exception):
+    """Raised when no Gemini call slot frees up within the queue timeout"""
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away while its Gemini call was running"""
+
+class GeminiLimiter:
+    """
+    Caps concurrent Gemini calls globally and per (hashed) API key, so one
+    key can't take every slot. Callers queue for a slot and get GeminiBusy
+    after queue_timeout seconds.
+    """
+
+    def __init__(self, global_limit: int, per_key_limit: int, queue_timeout: float):
+        self.global_limit = global_limit
+        self.per_key_limit = per_key_limit
+        self.queue_timeout = queue_timeout
+        # Semaphores are created on first use so they belong to the server's event loop
+        self._global = None
+        self._per_key = {}  # key hash -> [semaphore, callers holding or waiting]
+        self.waiting = 0
+        self.in_flight = 0
+
+    async def _acquire(self, semaphore: asyncio.Semaphore, deadline: float):
+        timeout = max(0.0, deadline - asyncio.get_running_loop().time())
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise GeminiBusy("The AI service is busy right now. Please try again in a moment.")
+
+    @asynccontextmanager
+    async def slot(self, api_key: str):
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.global_limit)
+        key_hash = hash_api_key(api_key)
+        entry = self._per_key.setdefault(key_hash, [asyncio.Semaphore(self.per_key_limit), 0])
+        entry[1] += 1
+        deadline = asyncio.get_running_loop().time() + self.queue_timeout
+        try:
+            self.waiting += 1
+            try:
+                await self._acquire(entry[0], deadline)
+                try:
+                    await self._acquire(self._global, deadline)
+                except BaseException:
+                    entry[0].release()
+                    raise
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                self._global.release()
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._per_key[key_hash]
+
+gemini_limiter = GeminiLimiter(GEMINI_MAX_CONCURRENCY, GEMINI_PER_KEY_CONCURRENCY, GEMINI_QUEUE_TIMEOUT)
+
+async def run_unless_disconnected(raw_request: Request, coro):
+    """Await coro, cancelling it if the client disconnects first"""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await raw_request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        task.cancel()
+
+async def generate(api_key: str, gemini_model, model_name: str, prompt: str):
+    """Run one Gemini generation without blocking the event loop, within the concurrency limits"""
+    if gemini_model._async_client is None:
+        gemini_model._async_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+    async with gemini_limiter.slot(api_key):
+        try:
+            return await gemini_model.generate_content_async(prompt)
         except Exception as e:
-            error_msg = str(e).lower()
-            if "404" in error_msg or "not found" in error_msg:
-                logger.warning(f"Model {model_name} not available (404)")
-            elif "permission" in error_msg or "forbidden" in error_msg:
-                logger.warning(f"Model {model_name} access denied")
-            else:
-                logger.warning(f"Model {model_name} failed: {type(e).__name__}: {str(e)}")
-            continue
-    
-    raise Exception("No working Gemini model found. Please check your API key and try again.")
+            model_cache.invalidate(api_key, model_name, e)
+            raise
+
+async def generate_content(raw_request: Request, api_key: str, gemini_model, model_name: str, prompt: str):
+    """Like generate(), but cancelled if the client disconnects"""
+    return await run_unless_disconnected(raw_request, generate(api_key, gemini_model, model_name, prompt))
+
+async def stream_content(api_key: str, gemini_model, model_name: str, prompt: str):
+    """
+    Yield the text chunks of one streamed Gemini generation, within the
+    concurrency limits. The SSE response cancels it if the client disconnects.
+    """
+    if gemini_model._async_client is None:
+        gemini_model._async_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+    async with gemini_limiter.slot(api_key):
+        try:
+            response = await gemini_model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. only safety ratings)
+                    continue
+                if text:
+                    yield text
+        except Exception as e:
+            model_cache.invalidate(api_key, model_name, e)
+            raise
 
 class AnalysisRequest(BaseModel):
     vehicle_name: str
@@ -117,11 +449,13 @@ class AnalysisRequest(BaseModel):
     monthly_spend: int
     ethanol_blend: str
     gemini_api_key: str
+    stream: bool = False
 
 class ChatRequest(BaseModel):
     question: str
     gemini_api_key: str
     context: Optional[Dict[str, Any]] = None
+    stream: bool = False
 
 @app.get("/api/health")
 async def health_check():
@@ -132,32 +466,92 @@ async def health_check():
         "service": "Gemini Ethanol Analyzer"
     }
 
-@app.post("/api/analyze")
-async def analyze_vehicle(request: AnalysisRequest):
+# Known vehicle specs, loaded once; vehicles not listed fall back to Gemini's own research
+VEHICLE_SPECS_PATH = os.environ.get("VEHICLE_SPECS_PATH", str(Path(__file__).parent / "data" / "vehicle_specs.csv"))
+
+def load_vehicle_index(path) -> VehicleIndex:
+    try:
+        index = VehicleIndex.load(path)
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"Could not load vehicle specs from {path}: {e}")
+        return VehicleIndex([])
+    logger.info(f"Loaded {len(index)} vehicle specs from {path}")
+    return index
+
+vehicle_index = load_vehicle_index(VEHICLE_SPECS_PATH)
+
+def describe_specs(spec: VehicleSpec, year: int) -> str:
+    materials = "rated for E20" if spec.e20_compliant(year) else "not certified for E20"
+    return (
+        f"Known specifications: {spec.category}, {spec.displacement_cc}cc engine, "
+        f"{spec.fuel_system_for(year)}, fuel system materials {materials}. Use these; do not research or restate them."
+    )
+
+DISPLACEMENT_RE = re.compile(r'(\d+)\s*cc')
+
+class VehicleInfoExtractor:
     """
-    Analyze ethanol blend impact using Gemini AI
+    Picks the fuel technology and engine displacement out of Gemini's report,
+    fed chunk by chunk as it streams in
     """
-    try:
-        # Get the first working model
-        gemini_model, model_name = get_working_model(request.gemini_api_key)
-        logger.info(f"Using model: {model_name} for analysis")
-        
-        # Parse vehicle name to extract brand and model
-        vehicle_parts = request.vehicle_name.strip().split()
-        brand = vehicle_parts[0] if vehicle_parts else "Unknown"
-        model = " ".join(vehicle_parts[1:]) if len(vehicle_parts) > 1 else "Unknown"
-        
-        # Create comprehensive prompt for Gemini
-        prompt = f"""
+    # Re-scan this much of the previous text so matches split across chunks are found
+    OVERLAP = 32
+
+    def __init__(self):
+        self._text = ""
+        self._scanned = 0
+        self.mentions_mpfi = False
+        self.mentions_fi = False
+        self.mentions_carburettor = False
+        self.displacement = None
+
+    def feed(self, chunk: str):
+        self._text += chunk.lower()
+        start = max(0, self._scanned - self.OVERLAP)
+        while start > 0 and self._text[start - 1].isdigit():
+            start -= 1
+        window = self._text[start:]
+        self.mentions_mpfi = self.mentions_mpfi or 'mpfi' in window
+        self.mentions_fi = self.mentions_fi or 'fi' in window or 'efi' in window
+        self.mentions_carburettor = self.mentions_carburettor or 'carburett' in window
+        if self.displacement is None:
+            displacement_match = DISPLACEMENT_RE.search(window)
+            if displacement_match:
+                self.displacement = f"{displacement_match.group(1)}cc"
+        self._scanned = len(self._text)
+
+    def apply(self, vehicle_info: Dict[str, Any]) -> Dict[str, Any]:
+        if self.mentions_mpfi:
+            vehicle_info["technology"] = "MPFI"
+        elif self.mentions_fi:
+            vehicle_info["technology"] = "Fuel Injection"
+        elif self.mentions_carburettor:
+            vehicle_info["technology"] = "Carburettor"
+        if self.displacement:
+            vehicle_info["displacement"] = self.displacement
+        return vehicle_info
+
+def build_analysis_prompt(request: AnalysisRequest) -> str:
+    # Cost arithmetic is done locally so the figures are exact and repeatable
+    cost = single_impact(request.monthly_spend, request.state, request.ethanol_blend, request.year)
+    annual = cost["annual_change"]
+    spec = vehicle_index.match(request.vehicle_name, request.year)
+    if spec is not None:
+        vehicle_name = spec.name
+        specs_line = describe_specs(spec, request.year)
+    else:
+        vehicle_name = request.vehicle_name
+        specs_line = "First, research and identify the technical specifications for this specific vehicle (engine displacement, fuel injection type, vehicle category - car/bike/scooter, etc.)."
+    return f"""
 You are an expert automotive fuel analyst specializing in ethanol blend compatibility for Indian vehicles. 
 
 Analyze the ethanol blend impact for this vehicle:
-- Vehicle: {request.vehicle_name} ({request.year})
+- Vehicle: {vehicle_name} ({request.year})
 - State: {request.state.replace('_', ' ').title()}
 - Monthly Fuel Spend: ₹{request.monthly_spend}
 - Ethanol Blend: {request.ethanol_blend.upper()}
 
-First, research and identify the technical specifications for this specific vehicle (engine displacement, fuel injection type, vehicle category - car/bike/scooter, etc.).
+{specs_line}
 Think Deeper.
 Please provide a comprehensive analysis in this EXACT format:
 
@@ -165,11 +559,11 @@ Please provide a comprehensive analysis in this EXACT format:
 
 **COST IMPACT:**
 - Current monthly fuel cost: ₹{request.monthly_spend}
-- With {request.ethanol_blend.upper()}: ₹[new_amount] ([savings/additional] ₹[amount])
-- Annual impact: ₹[amount] [saved/additional] per year
+- With {request.ethanol_blend.upper()}: ₹{cost["new_monthly_spend"]} ({describe_change(cost["monthly_change"])})
+- Annual impact: ₹{abs(annual)} {"saved" if annual < 0 else "additional"} per year
 
 **PERFORMANCE IMPACT:**
-- Fuel efficiency: [specific impact with percentage]
+- Fuel efficiency: {cost["efficiency_change_pct"]}% vs E10, [specific impact]
 - Power/torque: [specific impact]
 - Engine behavior: [specific details]
 
@@ -198,64 +592,534 @@ Important guidelines:
 1. Be specific to the exact vehicle model and year
 2. Consider Indian driving conditions and fuel quality
 3. Factor in the vehicle's age and likely condition
-4. Provide realistic cost calculations
+4. Copy the cost and fuel efficiency figures above exactly; they are computed from local fuel prices
 5. Include warranty considerations if relevant
 6. Be practical and actionable in recommendations
 """
 
-        # Generate response from Gemini
-        response = gemini_model.generate_content(prompt)
-        
-        if not response.text:
-            raise HTTPException(status_code=500, detail="No response from AI service")
-        
-        # Extract vehicle specifications from Gemini response
-        vehicle_info = {
-            "brand": brand.title(),
-            "model": model.title(),
+def build_vehicle_info(request: AnalysisRequest, spec: Optional[VehicleSpec] = None) -> Dict[str, Any]:
+    """Vehicle details known before the analysis; without a spec, technology and displacement are filled from it"""
+    if spec is not None:
+        return {
+            "brand": spec.brand,
+            "model": spec.model,
             "year": request.year,
-            "technology": "Various Technologies",
-            "displacement": "Multiple Options",
+            "category": spec.category,
+            "technology": spec.fuel_system_for(request.year),
+            "displacement": f"{spec.displacement_cc}cc",
             "age": datetime.now().year - request.year
         }
-        
-        # Try to extract technical specs from response if available
+    # Parse vehicle name to extract brand and model
+    vehicle_parts = request.vehicle_name.strip().split()
+    brand = vehicle_parts[0] if vehicle_parts else "Unknown"
+    model = " ".join(vehicle_parts[1:]) if len(vehicle_parts) > 1 else "Unknown"
+    return {
+        "brand": brand.title(),
+        "model": model.title(),
+        "year": request.year,
+        "technology": "Various Technologies",
+        "displacement": "Multiple Options",
+        "age": datetime.now().year - request.year
+    }
+
+def build_analysis_result(request: AnalysisRequest, vehicle_info: Dict[str, Any], summary: str) -> Dict[str, Any]:
+    return {
+        "vehicle_info": vehicle_info,
+        "cost_impact": single_impact(request.monthly_spend, request.state, request.ethanol_blend, request.year),
+        "analysis": {
+            "summary": summary,
+            "formatted": True,
+            "version": "gemini"
+        },
+        "ai_powered": True,
+        "ethanol_blend": request.ethanol_blend.upper(),
+        "state": request.state
+    }
+
+def build_chat_prompt(request: ChatRequest) -> str:
+    # Build context-aware prompt
+    context_info = ""
+    if request.context:
+        vehicle_info = request.context.get("vehicle_info", {})
+        if vehicle_info:
+            context_info = f"""
+Context: The user is asking about their {vehicle_info.get('brand', '')} {vehicle_info.get('model', '')} ({vehicle_info.get('year', '')}) in relation to ethanol blends.
+Previous Analysis: {request.context.get('analysis', {}).get('summary', '')[:500]}...
+"""
+    
+    return f"""
+You are an expert automotive fuel consultant specializing in ethanol blends for Indian vehicles.
+
+{context_info}
+
+User Question: {request.question}
+
+Please provide a helpful, accurate, and specific answer about ethanol blends, vehicle compatibility, or automotive fuel topics. Keep your response:
+1. Practical and actionable
+2. Specific to Indian conditions
+3. Technically accurate but easy to understand
+4. Focused on the user's specific question
+
+Answer:"""
+
+# Finished analyses are reused for this long, up to RESULT_CACHE_SIZE of them.
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", 24 * 3600))
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 2048))
+RUPEE_AMOUNT_RE = re.compile(r'₹\s?(\d[\d,]*(?:\.\d+)?)')
+
+def analysis_cache_key(request: AnalysisRequest):
+    """
+    Requests that should get the same report: same vehicle, year, state and
+    blend, with monthly spend in the same power-of-two bucket
+    """
+    spend_bucket = max(request.monthly_spend, 1).bit_length()
+    # Spellings of a known vehicle ("swift", "Maruti Swift VXI") share one entry
+    spec = vehicle_index.match(request.vehicle_name, request.year)
+    return (
+        canonical(spec.name if spec else request.vehicle_name),
+        request.year,
+        state_key(request.state),
+        request.ethanol_blend.strip().upper(),
+        spend_bucket
+    )
+
+def rescale_cost_impact(summary: str, from_spend: int, to_spend: int) -> str:
+    """Scale the rupee amounts in the COST IMPACT section from one monthly spend to another"""
+    if from_spend == to_spend or from_spend <= 0:
+        return summary
+    start = summary.find("**COST IMPACT:**")
+    if start == -1:
+        return summary
+    end = summary.find("**", start + len("**COST IMPACT:**"))
+    if end == -1:
+        end = len(summary)
+    ratio = to_spend / from_spend
+    section = RUPEE_AMOUNT_RE.sub(
+        lambda m: f"₹{round(float(m.group(1).replace(',', '')) * ratio)}", summary[start:end]
+    )
+    return summary[:start] + section + summary[end:]
+
+class ResultCache:
+    """Size-bounded LRU of finished analyses (report text, monthly spend it was written for) with a TTL"""
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (summary, monthly spend, stored at)
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[2] < self.ttl:
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[0], entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.counters["misses"] += 1
+        return None
+
+    def set(self, key, summary: str, monthly_spend: int):
+        self._entries[key] = (summary, monthly_spend, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+class SingleFlight:
+    """
+    Runs one task per key; concurrent callers with the same key await the
+    same task. The task is cancelled only once every caller has gone.
+    """
+
+    def __init__(self):
+        self._flights = {}  # key -> [task, callers]
+
+    async def do(self, key, make_coro, on_join=None):
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = [asyncio.ensure_future(make_coro()), 0]
+            self._flights[key] = flight
+            flight[0].add_done_callback(lambda _: self._flights.pop(key, None) if self._flights.get(key) is flight else None)
+        elif on_join is not None:
+            on_join()
+        flight[1] += 1
         try:
-            response_text = response.text.lower()
-            if any(tech in response_text for tech in ['mpfi', 'fi', 'efi', 'carburettor', 'carburetor']):
-                if 'mpfi' in response_text:
-                    vehicle_info["technology"] = "MPFI"
-                elif 'fi' in response_text or 'efi' in response_text:
-                    vehicle_info["technology"] = "Fuel Injection"
-                elif 'carburett' in response_text:
-                    vehicle_info["technology"] = "Carburettor"
-            
-            # Extract displacement if mentioned
-            import re
-            displacement_match = re.search(r'(\d+)\s*cc', response_text)
-            if displacement_match:
-                vehicle_info["displacement"] = f"{displacement_match.group(1)}cc"
-        except:
-            pass  # Keep defaults if parsing fails
-        
-        analysis_result = {
-            "vehicle_info": vehicle_info,
-            "analysis": {
-                "summary": response.text,
-                "formatted": True,
-                "version": "gemini"
-            },
-            "ai_powered": True,
-            "ethanol_blend": request.ethanol_blend.upper(),
-            "state": request.state
-        }
-        
+            return await asyncio.shield(flight[0])
+        finally:
+            flight[1] -= 1
+            if flight[1] == 0 and not flight[0].done():
+                # Later callers must start afresh rather than join a task being cancelled
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight[0].cancel()
+
+class SharedStream:
+    """Text chunks of one generation in progress, replayed from the start to every subscriber"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, text: str):
+        self.chunks.append(text)
+        self._notify()
+
+    def finish(self, error: Optional[Exception] = None):
+        if not self.done:
+            self.done = True
+            self.error = error
+            self._notify()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+class StreamFlights:
+    """
+    Streaming counterpart of SingleFlight: one producer task per key fills a
+    SharedStream, and concurrent callers with the same key all iterate it.
+    The producer is cancelled once every subscriber has gone.
+    """
+
+    def __init__(self):
+        self._flights = {}  # key -> [SharedStream, task, subscribers]
+
+    async def subscribe(self, key, produce, on_join=None):
+        flight = self._flights.get(key)
+        if flight is None:
+            shared = SharedStream()
+            flight = [shared, asyncio.ensure_future(produce(shared)), 0]
+            self._flights[key] = flight
+            flight[1].add_done_callback(lambda _: self._flights.pop(key, None) if self._flights.get(key) is flight else None)
+        elif on_join is not None:
+            on_join()
+        flight[2] += 1
+        try:
+            async for text in flight[0].subscribe():
+                yield text
+        finally:
+            flight[2] -= 1
+            if flight[2] == 0 and not flight[1].done():
+                # Later callers must start afresh rather than join a stream being cancelled
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight[1].cancel()
+
+    def __len__(self):
+        return len(self._flights)
+
+result_cache = ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_SIZE)
+analysis_flights = SingleFlight()
+analysis_streams = StreamFlights()
+
+def count_coalesced():
+    result_cache.counters["coalesced"] += 1
+
+def cached_analysis(request: AnalysisRequest, summary: str, monthly_spend: int) -> Dict[str, Any]:
+    """Analysis result for this request built from a report written for another monthly spend"""
+    summary = rescale_cost_impact(summary, monthly_spend, request.monthly_spend)
+    spec = vehicle_index.match(request.vehicle_name, request.year)
+    if spec is not None:
+        return build_analysis_result(request, build_vehicle_info(request, spec), summary)
+    extractor = VehicleInfoExtractor()
+    extractor.feed(summary)
+    return build_analysis_result(request, extractor.apply(build_vehicle_info(request)), summary)
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+MAX_BATCH_VEHICLES = int(os.environ.get("MAX_BATCH_VEHICLES", 1000))
+# Distinct vehicles per batch that get a Gemini compatibility note
+MAX_BATCH_AI_VEHICLES = int(os.environ.get("MAX_BATCH_AI_VEHICLES", 20))
+
+class FleetVehicle(BaseModel):
+    vehicle_name: str
+    year: int
+    state: str
+    monthly_spend: int
+    ethanol_blend: str
+
+summary_cache = ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_SIZE)
+
+def build_summary_prompt(vehicle: FleetVehicle) -> str:
+    spec = vehicle_index.match(vehicle.vehicle_name, vehicle.year)
+    vehicle_name = spec.name if spec else vehicle.vehicle_name
+    specs_line = describe_specs(spec, vehicle.year) if spec else ""
+    return f"""
+You are an expert automotive fuel analyst specializing in ethanol blend compatibility for Indian vehicles.
+
+In at most three sentences, assess how well a {vehicle_name} ({vehicle.year}) suits {vehicle.ethanol_blend.upper()} petrol: fuel system and material compatibility, and any maintenance to watch for.
+{specs_line}
+Do not discuss costs; they are computed separately.
+"""
+
+async def parse_fleet(raw_request: Request):
+    """Vehicles, per-row errors and options from a CSV or JSON batch body"""
+    body = await raw_request.body()
+    # The API key is never taken from the URL, where access logs would record it
+    options = {k: v for k, v in raw_request.query_params.items() if k != "gemini_api_key"}
+    if "csv" in raw_request.headers.get("content-type", ""):
+        rows = list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
+    else:
+        payload = json.loads(body or b"[]")
+        if isinstance(payload, dict):
+            options.update({k: v for k, v in payload.items() if k != "vehicles"})
+            payload = payload.get("vehicles", [])
+        rows = payload
+    if not isinstance(rows, list):
+        raise ValueError("Expected a list of vehicles")
+    if len(rows) > MAX_BATCH_VEHICLES:
+        raise ValueError(f"At most {MAX_BATCH_VEHICLES} vehicles per batch")
+
+    vehicles, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            vehicle = FleetVehicle(**row)
+            blend_index(vehicle.ethanol_blend)
+            state_key(vehicle.state)
+        except (TypeError, ValueError, ValidationError) as e:
+            errors.append({"row": index, "detail": str(e)})
+            continue
+        vehicles.append((index, vehicle))
+    return vehicles, errors, options
+
+def fleet_costs(vehicles: List) -> List[Dict[str, Any]]:
+    """Cost impact for every vehicle in one vectorized pass"""
+    if not vehicles:
+        return []
+    impact = cost_impact(
+        [v.monthly_spend for _, v in vehicles],
+        [v.state for _, v in vehicles],
+        [v.ethanol_blend for _, v in vehicles],
+        [v.year for _, v in vehicles],
+    )
+    return [
+        {"row": index, **vehicle.model_dump(), "cost_impact": cost}
+        for (index, vehicle), cost in zip(vehicles, impact_rows(impact))
+    ]
+
+def fleet_totals(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    return {
+        "vehicles": len(results),
+        "monthly_spend": sum(r["monthly_spend"] for r in results),
+        "new_monthly_spend": sum(r["cost_impact"]["new_monthly_spend"] for r in results),
+        "monthly_change": sum(r["cost_impact"]["monthly_change"] for r in results),
+        "annual_change": sum(r["cost_impact"]["annual_change"] for r in results),
+    }
+
+def summary_groups(vehicles: List) -> Dict[Any, List]:
+    """Rows grouped by (vehicle, year, blend) so each distinct vehicle is asked about once"""
+    groups = OrderedDict()
+    for index, vehicle in vehicles:
+        spec = vehicle_index.match(vehicle.vehicle_name, vehicle.year)
+        key = (canonical(spec.name if spec else vehicle.vehicle_name), vehicle.year, vehicle.ethanol_blend.strip().upper())
+        groups.setdefault(key, []).append((index, vehicle))
+    return groups
+
+def limit_groups(groups: Dict[Any, List], results: List[Dict[str, Any]]) -> Dict[Any, List]:
+    """The first MAX_BATCH_AI_VEHICLES groups; rows of the rest are marked ai_skipped in results"""
+    kept = OrderedDict(list(groups.items())[:MAX_BATCH_AI_VEHICLES])
+    skipped_rows = {index for members in list(groups.values())[MAX_BATCH_AI_VEHICLES:] for index, _ in members}
+    for result in results:
+        if result["row"] in skipped_rows:
+            result["ai_skipped"] = True
+    return kept
+
+async def fleet_summaries(api_key: str, groups: Dict[Any, List]):
+    """Yield (rows, summary or None, error or None) per distinct vehicle as Gemini answers"""
+    gemini_model, model_name = await run_in_threadpool(get_working_model, api_key)
+
+    async def summarize(key, members):
+        rows = [index for index, _ in members]
+        cached = summary_cache.get(key)
+        if cached is not None:
+            return rows, cached[0], None
+        try:
+            response = await generate(api_key, gemini_model, model_name, build_summary_prompt(members[0][1]))
+            summary_cache.set(key, response.text, 0)
+            return rows, response.text, None
+        except Exception as e:
+            return rows, None, str(e)
+
+    tasks = [asyncio.ensure_future(summarize(key, members)) for key, members in groups.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def stream_fleet(results, errors, api_key, groups):
+    try:
+        yield sse_event("costs", {"results": results, "totals": fleet_totals(results), "errors": errors})
+        try:
+            async for rows, summary, error in fleet_summaries(api_key, groups):
+                yield sse_event("summary", {"rows": rows, "ai_summary": summary, "error": error})
+        except Exception as e:
+            # e.g. no working model for the key; the costs above stand on their own
+            logger.error(f"Batch summaries failed: {str(e)}")
+            yield sse_event("ai_error", {"detail": str(e)})
+        yield sse_event("done", {})
+    except Exception as e:
+        logger.error(f"Batch analysis error: {str(e)}")
+        yield sse_event("error", {"detail": f"Batch analysis failed: {str(e)}"})
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from holding chunks back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def check_analysis_request(request: AnalysisRequest):
+    """ValueError for a state or blend the cost model can't price, before any Gemini call"""
+    state_key(request.state)
+    blend_index(request.ethanol_blend)
+
+async def stream_analysis(request: AnalysisRequest):
+    """SSE events for a streamed analysis: chunk events, then done (or error)"""
+    try:
+        check_analysis_request(request)
+        # Resolving a model first also rejects invalid keys before a cached report is served
+        with stage_metrics.time("analyze_stream", "model_resolution"):
+            gemini_model, model_name = await run_in_threadpool(get_working_model, request.gemini_api_key)
+        key = analysis_cache_key(request)
+        cached = result_cache.get(key)
+        if cached is not None:
+            with stage_metrics.time("analyze_stream", "post_processing"):
+                result = cached_analysis(request, *cached)
+            yield sse_event("chunk", {"text": result["analysis"]["summary"]})
+            yield sse_event("done", result)
+            return
+        logger.info(f"Using model: {model_name} for streamed analysis")
+        with stage_metrics.time("analyze_stream", "prompt_build"):
+            spec = vehicle_index.match(request.vehicle_name, request.year)
+            prompt = build_analysis_prompt(request)
+
+        async def produce(shared: SharedStream):
+            parts = []
+            started = time.perf_counter()
+            try:
+                async for text in stream_content(request.gemini_api_key, gemini_model, model_name, prompt):
+                    if not parts:
+                        stage_metrics.observe("analyze_stream", "gemini_first_chunk", time.perf_counter() - started)
+                    parts.append(text)
+                    shared.publish(text)
+                stage_metrics.observe("analyze_stream", "gemini_call", time.perf_counter() - started)
+                if not parts:
+                    raise Exception("No response from AI service")
+                result_cache.set(key, "".join(parts), request.monthly_spend)
+            except asyncio.CancelledError:
+                shared.finish(Exception("Analysis cancelled"))
+                raise
+            except Exception as e:
+                shared.finish(e)
+            finally:
+                shared.finish()
+
+        extractor = VehicleInfoExtractor() if spec is None else None
+        parts = []
+        # Identical requests arriving meanwhile replay this one Gemini stream. The
+        # exact spend is part of the key because the streamed cost figures depend on it.
+        async for text in analysis_streams.subscribe(key + (request.monthly_spend,), produce, count_coalesced):
+            if extractor is not None:
+                extractor.feed(text)
+            parts.append(text)
+            yield sse_event("chunk", {"text": text})
+        with stage_metrics.time("analyze_stream", "post_processing"):
+            summary = "".join(parts)
+            vehicle_info = build_vehicle_info(request, spec)
+            if extractor is not None:
+                vehicle_info = extractor.apply(vehicle_info)
+            result = build_analysis_result(request, vehicle_info, summary)
+        yield sse_event("done", result)
+    except Exception as e:
+        logger.error(f"Analysis error: {str(e)}")
+        yield sse_event("error", {"detail": f"Analysis failed: {str(e)}"})
+
+async def stream_chat(request: ChatRequest):
+    """SSE events for a streamed chat answer: chunk events, then done (or error)"""
+    try:
+        with stage_metrics.time("chat_stream", "model_resolution"):
+            gemini_model, model_name = await run_in_threadpool(get_working_model, request.gemini_api_key)
+        logger.info(f"Using model: {model_name} for streamed chat")
+        with stage_metrics.time("chat_stream", "prompt_build"):
+            prompt = build_chat_prompt(request)
+        parts = []
+        started = time.perf_counter()
+        async for text in stream_content(request.gemini_api_key, gemini_model, model_name, prompt):
+            if not parts:
+                stage_metrics.observe("chat_stream", "gemini_first_chunk", time.perf_counter() - started)
+            parts.append(text)
+            yield sse_event("chunk", {"text": text})
+        stage_metrics.observe("chat_stream", "gemini_call", time.perf_counter() - started)
+        if not parts:
+            raise Exception("No response from AI service")
+        yield sse_event("done", {"answer": "".join(parts), "timestamp": datetime.now().isoformat()})
+    except Exception as e:
+        logger.error(f"Chat error: {str(e)}")
+        yield sse_event("error", {"detail": f"Chat failed: {str(e)}"})
+
+@app.post("/api/analyze")
+async def analyze_vehicle(request: AnalysisRequest, raw_request: Request):
+    """
+    Analyze ethanol blend impact using Gemini AI
+
+    With "stream": true the report is sent as server-sent events instead.
+    """
+    if request.stream:
+        return sse_response(stream_analysis(request))
+    try:
+        check_analysis_request(request)
+        # Get the first working model; this also rejects invalid keys before a cached report is served
+        with stage_metrics.time("analyze", "model_resolution"):
+            gemini_model, model_name = await run_in_threadpool(get_working_model, request.gemini_api_key)
+        key = analysis_cache_key(request)
+        report = result_cache.get(key)
+        if report is None:
+            logger.info(f"Using model: {model_name} for analysis")
+
+            async def run_analysis():
+                with stage_metrics.time("analyze", "prompt_build"):
+                    prompt = build_analysis_prompt(request)
+                # Generate response from Gemini
+                with stage_metrics.time("analyze", "gemini_call"):
+                    response = await generate(request.gemini_api_key, gemini_model, model_name, prompt)
+                if not response.text:
+                    raise HTTPException(status_code=500, detail="No response from AI service")
+                result_cache.set(key, response.text, request.monthly_spend)
+                return response.text, request.monthly_spend
+
+            # Identical requests arriving meanwhile share this one Gemini call
+            report = await run_unless_disconnected(raw_request, analysis_flights.do(key, run_analysis, count_coalesced))
+
+        with stage_metrics.time("analyze", "post_processing"):
+            result = cached_analysis(request, *report)
         return {
             "success": True,
-            "data": analysis_result,
+            "data": result,
             "message": "Analysis completed successfully using Gemini AI"
         }
-        
+
+    except ClientDisconnected:
+        logger.info("Client disconnected, analysis cancelled")
+        return {"success": False, "data": None, "detail": "Analysis cancelled"}
     except Exception as e:
         logger.error(f"Analysis error: {str(e)}")
         return {
@@ -264,55 +1128,107 @@ Important guidelines:
             "detail": f"Analysis failed: {str(e)}"
         }
 
+@app.post("/api/analyze/batch")
+async def analyze_batch(raw_request: Request):
+    """
+    Cost impact for a fleet, computed locally
+
+    Accepts CSV (vehicle_name,year,state,monthly_spend,ethanol_blend columns)
+    or JSON ({"vehicles": [...]} or a bare list). With ai_summaries and a
+    gemini_api_key (JSON field or X-Gemini-Api-Key header) each distinct
+    vehicle, up to MAX_BATCH_AI_VEHICLES, also gets a short Gemini
+    compatibility note; rows beyond that are marked ai_skipped. With stream
+    the costs are sent at once and the notes follow as server-sent events.
+    If no note can be produced at all, ai_error says why and the costs are
+    still returned.
+    """
+    try:
+        vehicles, errors, options = await parse_fleet(raw_request)
+        results = fleet_costs(vehicles)
+        api_key = options.get("gemini_api_key") or raw_request.headers.get("x-gemini-api-key")
+        want_summaries = str(options.get("ai_summaries", "")).lower() in ("1", "true", "yes")
+        groups = limit_groups(summary_groups(vehicles), results) if want_summaries and api_key else {}
+
+        if groups and str(options.get("stream", "")).lower() in ("1", "true", "yes"):
+            return sse_response(stream_fleet(results, errors, api_key, groups))
+
+        ai_error = None
+        if groups:
+            by_row = {r["row"]: r for r in results}
+
+            async def collect():
+                async for rows, summary, error in fleet_summaries(api_key, groups):
+                    for row in rows:
+                        by_row[row]["ai_summary"] = summary
+                        if error:
+                            by_row[row]["ai_error"] = error
+
+            try:
+                await run_unless_disconnected(raw_request, collect())
+            except ClientDisconnected:
+                raise
+            except Exception as e:
+                # e.g. no working model for the key; the costs need no Gemini call
+                logger.error(f"Batch summaries failed: {str(e)}")
+                ai_error = str(e)
+
+        data = {"results": results, "totals": fleet_totals(results), "errors": errors}
+        if ai_error:
+            data["ai_error"] = ai_error
+        return {
+            "success": True,
+            "data": data,
+            "message": f"Analyzed {len(results)} vehicles"
+        }
+
+    except ClientDisconnected:
+        logger.info("Client disconnected, batch analysis cancelled")
+        return {"success": False, "data": None, "detail": "Batch analysis cancelled"}
+    except Exception as e:
+        logger.error(f"Batch analysis error: {str(e)}")
+        return {
+            "success": False,
+            "data": None,
+            "detail": f"Batch analysis failed: {str(e)}"
+        }
+
 @app.post("/api/chat")
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, raw_request: Request):
     """
     Chat with Gemini AI about ethanol and vehicles
+
+    With "stream": true the answer is sent as server-sent events instead.
     """
+    if request.stream:
+        return sse_response(stream_chat(request))
     try:
         # Get the first working model
-        gemini_model, model_name = get_working_model(request.gemini_api_key)
+        with stage_metrics.time("chat", "model_resolution"):
+            gemini_model, model_name = await run_in_threadpool(get_working_model, request.gemini_api_key)
         logger.info(f"Using model: {model_name} for chat")
-        
-        # Build context-aware prompt
-        context_info = ""
-        if request.context:
-            vehicle_info = request.context.get("vehicle_info", {})
-            if vehicle_info:
-                context_info = f"""
-Context: The user is asking about their {vehicle_info.get('brand', '')} {vehicle_info.get('model', '')} ({vehicle_info.get('year', '')}) in relation to ethanol blends.
-Previous Analysis: {request.context.get('analysis', {}).get('summary', '')[:500]}...
-"""
-        
-        chat_prompt = f"""
-You are an expert automotive fuel consultant specializing in ethanol blends for Indian vehicles.
-
-{context_info}
-
-User Question: {request.question}
-
-Please provide a helpful, accurate, and specific answer about ethanol blends, vehicle compatibility, or automotive fuel topics. Keep your response:
-1. Practical and actionable
-2. Specific to Indian conditions
-3. Technically accurate but easy to understand
-4. Focused on the user's specific question
 
-Answer:"""
+        with stage_metrics.time("chat", "prompt_build"):
+            prompt = build_chat_prompt(request)
+        with stage_metrics.time("chat", "gemini_call"):
+            response = await generate_content(raw_request, request.gemini_api_key, gemini_model, model_name, prompt)
 
-        response = gemini_model.generate_content(chat_prompt)
-        
-        if not response.text:
+        with stage_metrics.time("chat", "post_processing"):
+            answer = response.text
+        if not answer:
             raise HTTPException(status_code=500, detail="No response from AI service")
-        
+
         return {
             "success": True,
             "data": {
-                "answer": response.text,
+                "answer": answer,
                 "timestamp": datetime.now().isoformat()
             },
             "message": "Chat response generated successfully"
         }
-        
+
+    except ClientDisconnected:
+        logger.info("Client disconnected, chat cancelled")
+        return {"success": False, "data": None, "detail": "Chat cancelled"}
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
         return {
@@ -321,18 +1237,52 @@ Answer:"""
             "detail": f"Chat failed: {str(e)}"
         }
 
+MAX_VEHICLE_SUGGESTIONS = 25
+
 @app.get("/api/vehicles")
-async def get_vehicles():
+async def get_vehicles(q: str = "", limit: int = 10):
     """
-    Return a simplified vehicle list - Gemini will handle the detailed analysis
+    Autocomplete vehicle names from the local spec index
+
+    Vehicles that are not listed can still be analyzed; Gemini researches them.
     """
+    limit = max(1, min(limit, MAX_VEHICLE_SUGGESTIONS))
     return {
         "success": True,
         "data": {
-            "message": "Vehicle database not needed - Gemini AI analyzes all vehicles dynamically",
-            "note": "Simply enter your vehicle details and Gemini will provide comprehensive analysis"
+            "vehicles": [spec.to_dict() for spec in vehicle_index.suggest(q, limit)],
+            "total": len(vehicle_index)
+        },
+        "message": "Vehicle suggestions"
+    }
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """
+    Stage latency histograms, in-flight counts and cache hit rates
+
+    Every worker process keeps its own numbers; pid tells them apart.
+    """
+    return {
+        "success": True,
+        "data": {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - stage_metrics.started_at, 1),
+            "in_flight": {
+                "requests": stage_metrics.requests_in_flight,
+                "gemini_calls": gemini_limiter.in_flight,
+                "gemini_waiting": gemini_limiter.waiting,
+                "shared_analyses": len(analysis_flights._flights) + len(analysis_streams)
+            },
+            "requests_total": stage_metrics.requests_total,
+            "stages": stage_metrics.snapshot(),
+            "caches": {
+                "model": hit_rate(model_cache.counters),
+                "analysis": hit_rate(result_cache.counters),
+                "fleet_summary": hit_rate(summary_cache.counters)
+            }
         },
-        "message": "Gemini AI handles all vehicle types dynamically"
+        "message": "Metrics for this worker process"
     }
 
 if __name__ == "__main__":
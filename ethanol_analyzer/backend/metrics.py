@@ -0,0 +1,103 @@
+"""
+Per-stage latency histograms and in-flight counts for /api/metrics
+Numbers are per worker process; they are updated on the event loop, so no locking
+"""
+
+import bisect
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum and maximum"""
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(BUCKETS + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.total, 6),
+            "mean_seconds": round(self.total / self.count, 6) if self.count else None,
+            "max_seconds": round(self.max, 6),
+            "p50_seconds": round(self.quantile(0.5), 6) if self.count else None,
+            "p95_seconds": round(self.quantile(0.95), 6) if self.count else None,
+            "p99_seconds": round(self.quantile(0.99), 6) if self.count else None,
+            "buckets": buckets
+        }
+
+class StageMetrics:
+    """Histograms keyed by (endpoint, stage), plus HTTP requests in flight"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._histograms = defaultdict(Histogram)
+        self.requests_in_flight = 0
+        self.requests_total = 0
+
+    def observe(self, endpoint: str, stage: str, seconds: float):
+        self._histograms[(endpoint, stage)].observe(seconds)
+
+    @contextmanager
+    def time(self, endpoint: str, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(endpoint, stage, time.perf_counter() - started)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        stages = defaultdict(dict)
+        for (endpoint, stage), histogram in sorted(self._histograms.items()):
+            stages[endpoint][stage] = histogram.to_dict()
+        return dict(stages)
+
+class InFlightMiddleware:
+    """Counts HTTP requests until their last body chunk is sent, streamed responses included"""
+
+    def __init__(self, app, metrics: StageMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.metrics.requests_in_flight += 1
+        self.metrics.requests_total += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.metrics.requests_in_flight -= 1
+
+def hit_rate(counters: Dict[str, int]) -> Dict[str, Any]:
+    """Cache counters with the share of lookups that were hits"""
+    lookups = counters.get("hits", 0) + counters.get("misses", 0)
+    return dict(counters, hit_rate=round(counters.get("hits", 0) / lookups, 4) if lookups else None)
@@ -0,0 +1,117 @@
+"""
+Frontend assets held in memory
+Each file is read and precompressed once at startup, then served with strong
+ETags and 304s without touching the filesystem again
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone is used without it
+    brotli = None
+
+# Fingerprinted names such as app.3f9a1c2e.js never change content
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{8,}\.[A-Za-z0-9]+$')
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Unhashed files may change on deploy, so browsers revalidate them with the ETag
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Smaller bodies gain nothing from compression
+MIN_COMPRESS_SIZE = 512
+# Best encoding first
+ENCODINGS = ("br", "gzip", "identity")
+
+def accepted_encodings(header: str) -> Set[str]:
+    """Codings an Accept-Encoding header allows (q > 0)"""
+    accepted = {"identity"}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                continue
+        if not name:
+            continue
+        if quality > 0:
+            accepted.update(ENCODINGS if name == "*" else (name,))
+        else:
+            accepted.discard(name)
+    return accepted
+
+class StaticAsset:
+    """One file's bytes in every encoding worth sending, each with its own strong ETag"""
+    __slots__ = ("media_type", "cache_control", "variants")
+
+    def __init__(self, name: str, body: bytes):
+        # Starlette adds the charset for text/* types
+        self.media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if HASHED_NAME_RE.search(name) else REVALIDATE_CACHE_CONTROL
+
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        self.variants: Dict[str, tuple] = {"identity": (body, f'"{digest}"')}  # encoding -> (body, etag)
+        if len(body) >= MIN_COMPRESS_SIZE:
+            compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(body, quality=11)
+            for encoding, data in compressed.items():
+                if len(data) < len(body):
+                    self.variants[encoding] = (data, f'"{digest}-{encoding}"')
+
+    @property
+    def size(self) -> int:
+        return len(self.variants["identity"][0])
+
+    def response(self, request: Request) -> Response:
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((e for e in ENCODINGS if e in self.variants and e in accepted), "identity")
+        body, etag = self.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip() for tag in if_none_match.split(",")}
+            if "*" in tags or any(variant_etag in tags for _, variant_etag in self.variants.values()):
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+class AssetStore:
+    """Files of one directory by relative path; nothing outside it is reachable"""
+
+    def __init__(self):
+        self._assets: Dict[str, StaticAsset] = {}
+
+    @classmethod
+    def from_directory(cls, directory: Path) -> "AssetStore":
+        store = cls()
+        if directory.is_dir():
+            for path in sorted(directory.rglob("*")):
+                relative = path.relative_to(directory)
+                if path.is_file() and not any(part.startswith(".") for part in relative.parts):
+                    store.add(relative.as_posix(), path.read_bytes())
+        return store
+
+    def add(self, name: str, body: bytes) -> StaticAsset:
+        asset = StaticAsset(name, body)
+        self._assets[name] = asset
+        return asset
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        return self._assets.get(name)
+
+    def __len__(self):
+        return len(self._assets)
@@ -0,0 +1,188 @@
+"""
+Vehicle specification index
+Loaded once from a CSV into sorted in-memory keys for prefix autocomplete
+and whole-word name lookup
+"""
+
+import bisect
+import csv
+import difflib
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Words that name a different powertrain than the petrol spec they would otherwise match
+POWERTRAIN_WORDS = frozenset({"ev", "electric", "cng", "lpg", "hybrid", "phev", "diesel"})
+# Trim words that also occur in some model names ("Splendor Plus") but never tell vehicles apart
+TRIM_WORDS = frozenset({"plus", "pro", "deluxe", "sport", "new"})
+# Words with digits that don't change the engine: generations, emission norms, years
+HARMLESS_NUMBER_RE = re.compile(r'^(\d{1,2}g|bs\d|gen\d+|mk\d+|(19|20)\d\d)$')
+
+
+def canonical(text: str) -> str:
+    return " ".join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+
+
+def _optional_int(value: str) -> Optional[int]:
+    value = (value or "").strip()
+    return int(value) if value else None
+
+
+class VehicleSpec(NamedTuple):
+    brand: str
+    model: str
+    category: str
+    fuel_system: str
+    displacement_cc: int
+    year_from: int
+    year_to: Optional[int]
+    carburettor_until: Optional[int]
+    e20_material_compliant_from: Optional[int]
+    aliases: Tuple[str, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return f"{self.brand} {self.model}"
+
+    def covers(self, year: int) -> bool:
+        return self.year_from <= year and (self.year_to is None or year <= self.year_to)
+
+    def fuel_system_for(self, year: int) -> str:
+        if self.carburettor_until is not None and year <= self.carburettor_until:
+            return "Carburettor"
+        return self.fuel_system
+
+    def e20_compliant(self, year: int) -> bool:
+        return self.e20_material_compliant_from is not None and year >= self.e20_material_compliant_from
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "brand": self.brand,
+            "model": self.model,
+            "category": self.category,
+            "fuel_system": self.fuel_system,
+            "displacement": f"{self.displacement_cc}cc",
+            "years": [self.year_from, self.year_to],
+        }
+
+
+class VehicleIndex:
+    """
+    Each spec is reachable by "brand model", by the brand's first word plus
+    the model ("maruti swift") and by the model alone, for its model name and
+    each alias.
+
+    match() only accepts a key whose every word is in the query. The query's
+    other words must be harmless trim names ("vxi"): not words of another
+    vehicle, not a powertrain such as EV or CNG, and not numbers other than
+    generations or years. Anything else returns None, because a wrong spec is
+    worse than none. suggest() is fuzzy, since the user picks from its results.
+    """
+    MIN_SUGGEST_SCORE = 0.7
+
+    def __init__(self, specs: List[VehicleSpec]):
+        self.specs = tuple(specs)
+        self._exact = {}  # key -> spec ids
+        self._by_word = {}  # word -> keys containing it
+        self._spec_words = []  # spec id -> words of its brand, model and aliases
+        for spec_id, spec in enumerate(self.specs):
+            words = set()
+            for key in self._keys_for(spec):
+                self._exact.setdefault(key, []).append(spec_id)
+                words.update(key.split())
+            self._spec_words.append(frozenset(words))
+        for key in self._exact:
+            for word in key.split():
+                self._by_word.setdefault(word, set()).add(key)
+        self._vocabulary = frozenset(self._by_word)
+        self._sorted_keys = sorted(self._exact)
+
+    @staticmethod
+    def _keys_for(spec: VehicleSpec):
+        brand = canonical(spec.brand)
+        keys = set()
+        for model in (canonical(spec.model),) + tuple(canonical(a) for a in spec.aliases):
+            keys.update({f"{brand} {model}", f"{brand.split()[0]} {model}", model})
+        return keys
+
+    @classmethod
+    def load(cls, path) -> "VehicleIndex":
+        with open(path, newline="", encoding="utf-8") as f:
+            specs = [
+                VehicleSpec(
+                    brand=row["brand"].strip(),
+                    model=row["model"].strip(),
+                    category=row["category"].strip(),
+                    fuel_system=row["fuel_system"].strip(),
+                    displacement_cc=int(row["displacement_cc"]),
+                    year_from=int(row["year_from"]),
+                    year_to=_optional_int(row["year_to"]),
+                    carburettor_until=_optional_int(row["carburettor_until"]),
+                    e20_material_compliant_from=_optional_int(row["e20_material_compliant_from"]),
+                    aliases=tuple(a.strip() for a in (row.get("aliases") or "").split("|") if a.strip()),
+                )
+                for row in csv.DictReader(f)
+            ]
+        return cls(specs)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def _pick(self, spec_ids: List[int], year: Optional[int]) -> VehicleSpec:
+        if year is not None:
+            for spec_id in spec_ids:
+                if self.specs[spec_id].covers(year):
+                    return self.specs[spec_id]
+        return self.specs[spec_ids[0]]
+
+    def _harmless(self, word: str, spec_ids: List[int]) -> bool:
+        """Whether an extra query word leaves the match with these specs intact"""
+        if any(word in self._spec_words[spec_id] for spec_id in spec_ids):
+            return True
+        if word in POWERTRAIN_WORDS or (word in self._vocabulary and word not in TRIM_WORDS):
+            return False
+        return not any(c.isdigit() for c in word) or bool(HARMLESS_NUMBER_RE.match(word))
+
+    def match(self, name: str, year: Optional[int] = None) -> Optional[VehicleSpec]:
+        """Spec for a free-text vehicle name, or None unless it matches unambiguously"""
+        query = canonical(name)
+        spec_ids = self._exact.get(query)
+        if spec_ids:
+            return self._pick(spec_ids, year)
+        words = set(query.split())
+        candidates = {key for word in words for key in self._by_word.get(word, ())}
+        matches = {}  # words matched -> distinct spec id groups
+        for key in candidates:
+            key_words = set(key.split())
+            if not key_words <= words:
+                continue
+            spec_ids = self._exact[key]
+            if all(self._harmless(word, spec_ids) for word in words - key_words):
+                matches.setdefault(len(key_words), set()).add(tuple(spec_ids))
+        if not matches:
+            return None
+        best = matches[max(matches)]
+        # Two different vehicles explaining the query equally well: don't guess
+        return self._pick(list(next(iter(best))), year) if len(best) == 1 else None
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[VehicleSpec]:
+        """Specs whose name starts with prefix, topped up with fuzzy matches"""
+        query = canonical(prefix)
+        if not query:
+            return []
+        found = []
+
+        def add(spec_ids):
+            for spec_id in spec_ids:
+                if spec_id not in found:
+                    found.append(spec_id)
+
+        start = bisect.bisect_left(self._sorted_keys, query)
+        for key in self._sorted_keys[start:]:
+            if not key.startswith(query) or len(found) >= limit:
+                break
+            add(self._exact[key])
+        if len(found) < limit:
+            for key in difflib.get_close_matches(query, self._sorted_keys, n=limit, cutoff=self.MIN_SUGGEST_SCORE):
+                add(self._exact[key])
+        return [self.specs[spec_id] for spec_id in found[:limit]]
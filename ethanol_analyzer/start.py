@@ -2,6 +2,10 @@
 """
 Start script for Gemini Ethanol Analyzer
 For EC2 deployment - serves both API and static files
+
+    python start.py                  # one process
+    python start.py --dev            # one process, reload on code changes
+    python start.py --prod           # one worker per CPU (WEB_CONCURRENCY or --workers N to override)
 """
 
 import subprocess
@@ -9,26 +13,84 @@ import sys
 import os
 from pathlib import Path
 
+APP = "backend.main_gemini:app"
+BIND_HOST = "0.0.0.0"
+PORT = 8001
+# Seconds a stopping worker gets to finish in-flight requests; Gemini calls can take a while
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", 60))
+PID_FILE = "gunicorn.pid"
+
+def has_module(python: str, name: str) -> bool:
+    """Whether that interpreter can import the module"""
+    return subprocess.run([python, "-c", f"import {name}"], capture_output=True).returncode == 0
+
+def worker_count() -> int:
+    if "--workers" in sys.argv:
+        return int(sys.argv[sys.argv.index("--workers") + 1])
+    return int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+def server_command(python: str):
+    """
+    Command line that runs the app with the options given to this script
+
+    In --prod mode gunicorn manages uvicorn workers: the app is imported once
+    before forking (--preload), kill -HUP reloads workers gracefully and
+    SIGTERM drains in-flight requests for up to GRACEFUL_TIMEOUT seconds.
+    Without gunicorn, uvicorn's own --workers is used (no preload). uvicorn
+    picks uvloop and httptools whenever they are installed.
+    """
+    if "--prod" not in sys.argv:
+        return [
+            python, "-m", "uvicorn", APP,
+            "--host", BIND_HOST,
+            "--port", str(PORT),
+            "--reload" if "--dev" in sys.argv else "--no-reload"
+        ]
+    workers = worker_count()
+    if has_module(python, "gunicorn"):
+        return [
+            python, "-m", "gunicorn", APP,
+            "--worker-class", "uvicorn.workers.UvicornWorker",
+            "--workers", str(workers),
+            "--bind", f"{BIND_HOST}:{PORT}",
+            "--preload",
+            "--graceful-timeout", str(GRACEFUL_TIMEOUT),
+            "--timeout", str(GRACEFUL_TIMEOUT * 2),
+            "--keep-alive", "5",
+            "--pid", PID_FILE
+        ]
+    return [
+        python, "-m", "uvicorn", APP,
+        "--host", BIND_HOST,
+        "--port", str(PORT),
+        "--workers", str(workers),
+        "--timeout-graceful-shutdown", str(GRACEFUL_TIMEOUT)
+    ]
+
+def run_server(cmd):
+    """Run the server; in --prod mode on POSIX it replaces this process so signals reach it directly"""
+    if "--prod" in sys.argv and os.name == "posix":
+        sys.stdout.flush()
+        os.execv(cmd[0], cmd)
+    subprocess.run(cmd, check=True)
+
 def main():
     # Change to the directory containing this script
     script_dir = Path(__file__).parent
     os.chdir(script_dir)
-    
+
     print("🚀 Starting Gemini Ethanol Analyzer...")
     print(f"📁 Working directory: {script_dir}")
     print("🌐 Frontend will be available at: http://your-ec2-ip:8001")
     print("🔗 API endpoints available at: http://your-ec2-ip:8001/api/")
     print("💡 Users need Gemini API key from: https://aistudio.google.com/")
-    
+
     # Start the backend server with static file serving
     try:
-        subprocess.run([
-            sys.executable, "-m", "uvicorn", 
-            "backend.main_gemini:app", 
-            "--host", "0.0.0.0", 
-            "--port", "8001",
-            "--reload" if "--dev" in sys.argv else "--no-reload"
-        ], check=True)
+        cmd = server_command(sys.executable)
+        if "--prod" in sys.argv:
+            print(f"⚙️  {worker_count()} workers: {' '.join(cmd[1:])}")
+        run_server(cmd)
     except KeyboardInterrupt:
         print("\n👋 Shutting down server...")
     except Exception as e:
@@ -37,4 +99,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
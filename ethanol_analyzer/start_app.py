@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 """
 Start script for Ethanol Analyzer - Alternative to systemd
+Takes the same --dev / --prod / --workers N options as start.py
 """
 
-import subprocess
 import sys
 import os
 from pathlib import Path
 
+from start import run_server, server_command
+
 def main():
     # Ensure we're in the right directory
     script_dir = Path(__file__).parent
@@ -28,16 +30,10 @@ def main():
     python_path = venv_path / "bin" / "python"
     
     try:
-        cmd = [
-            str(python_path), "-m", "uvicorn",
-            "backend.main_gemini:app",
-            "--host", "0.0.0.0",
-            "--port", "8001",
-            "--reload" if "--dev" in sys.argv else "--no-reload"
-        ]
+        cmd = server_command(str(python_path))
         
         print(f"🔄 Running command: {' '.join(cmd)}")
-        subprocess.run(cmd, check=True)
+        run_server(cmd)
         
     except KeyboardInterrupt:
         print("\n👋 Shutting down server...")
@@ -1,13 +1,21 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 import os
 import json
 from datetime import datetime
 
+from downloads import file_response
+from storage import WriteBehindBuffer, open_storage
+from uploads import (
+    CHUNK_SIZE, BlobStore, ChunkedUpload, OffsetMismatch, UploadNotFound, UploadSessions, UploadTooLarge,
+    remove_if_exists
+)
+
 app = FastAPI(title="Animal & File API", version="1.0.0")
 
 app.add_middleware(
@@ -28,21 +36,67 @@ class FileInfo(BaseModel):
     content_type: str
     timestamp: str
 
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int
+    content_type: Optional[str] = None
+
 UPLOADS_DIR = "uploads"
 DATA_FILE = "data.json"
+DB_FILE = os.environ.get("DB_FILE", "data.db")
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sqlite")
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 512 * 1024 * 1024))
+# Resumable upload sessions untouched for this many seconds are deleted
+UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL", 24 * 3600))
+MAX_PAGE_SIZE = 1000
+NDJSON_BATCH_LINES = 500
+MAX_BATCH_SELECTIONS = int(os.environ.get("MAX_BATCH_SELECTIONS", 10000))
+# Generous per selection ({"animal": "elephant", ...} plus whitespace), so oversized bodies are refused unparsed
+MAX_BATCH_BODY_BYTES = MAX_BATCH_SELECTIONS * 256
+# >0 acknowledges single selections before they are written and flushes them
+# in one transaction per window; up to this many ms of selections can be lost on a crash
+ANIMAL_WRITE_BEHIND_MS = int(os.environ.get("ANIMAL_WRITE_BEHIND_MS", 0))
+VALID_ANIMALS = {"cat", "dog", "elephant"}
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
 
 if not os.path.exists(UPLOADS_DIR):
     os.makedirs(UPLOADS_DIR)
 
+# "sqlite" (default) imports an existing data.json on first start; "json" keeps the old file format
+storage = open_storage(STORAGE_BACKEND, DATA_FILE, DB_FILE)
+upload_sessions = UploadSessions(os.path.join(UPLOADS_DIR, ".partial"), MAX_UPLOAD_BYTES, UPLOAD_SESSION_TTL)
+# Uploads are stored once per distinct content; file records point at the blob
+blob_store = BlobStore(os.path.join(UPLOADS_DIR, "blobs"))
+animal_writes = WriteBehindBuffer(storage.add_animals, ANIMAL_WRITE_BEHIND_MS / 1000) if ANIMAL_WRITE_BEHIND_MS > 0 else None
+
 def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {"animals": [], "files": []}
+    flush_animal_writes()
+    return storage.load()
 
 def save_data(data):
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    flush_animal_writes()
+    storage.save(data)
+
+def flush_animal_writes():
+    # Readers see every acknowledged selection, even inside the write-behind window
+    if animal_writes:
+        animal_writes.flush()
+
+@app.on_event("shutdown")
+def close_storage():
+    if animal_writes:
+        animal_writes.close()
+    storage.close()
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Refuse before the multipart body is spooled anywhere
+    if request.method == "POST" and request.url.path == "/file/upload":
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+            return JSONResponse(status_code=413, content={"detail": "File too large"})
+    return await call_next(request)
 
 @app.get("/")
 async def read_root():
@@ -54,102 +108,285 @@ async def api_root():
 
 @app.post("/animal/select")
 async def select_animal(selection: AnimalSelection):
-    valid_animals = ["cat", "dog", "elephant"]
-    
-    if selection.animal not in valid_animals:
+    if selection.animal not in VALID_ANIMALS:
         raise HTTPException(status_code=400, detail="Invalid animal selection")
     
-    data = load_data()
-    
     animal_data = {
         "animal": selection.animal,
         "timestamp": datetime.now().isoformat()
     }
     
-    data["animals"].append(animal_data)
-    save_data(data)
+    if animal_writes:
+        animal_writes.extend([animal_data])
+    else:
+        await run_in_threadpool(storage.add_animal, animal_data)
     
     return {
         "message": f"{selection.animal.capitalize()} selected successfully",
         "data": animal_data
     }
 
-@app.get("/animal/history")
-async def get_animal_history():
-    data = load_data()
-    return {"history": data["animals"]}
+def batch_too_large():
+    return HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SELECTIONS} selections")
 
-@app.post("/file/upload")
-async def upload_file(file: UploadFile = File(...)):
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No file selected")
+async def bounded_stream(request):
+    """Request body chunks, refusing bodies over MAX_BATCH_BODY_BYTES before and while reading"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_BATCH_BODY_BYTES:
+        raise batch_too_large()
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_BATCH_BODY_BYTES:
+            raise batch_too_large()
+        yield chunk
+
+async def read_batch_items(request):
+    if "application/x-ndjson" in request.headers.get("content-type", ""):
+        items, pending = [], b""
+        async for chunk in bounded_stream(request):
+            *lines, pending = (pending + chunk).split(b"\n")
+            items.extend(json.loads(line) for line in lines if line.strip())
+            if len(items) > MAX_BATCH_SELECTIONS:
+                break
+        if pending.strip():
+            items.append(json.loads(pending))
+        return items
+    body = bytearray()
+    async for chunk in bounded_stream(request):
+        body.extend(chunk)
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array")
+    return items
+
+@app.post("/animal/select/batch")
+async def select_animals_batch(request: Request):
+    """Record many selections (JSON array or NDJSON of {"animal": ...}) in one write."""
+    try:
+        items = await read_batch_items(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {e}")
     
-    file_path = os.path.join(UPLOADS_DIR, file.filename)
+    if len(items) > MAX_BATCH_SELECTIONS:
+        raise batch_too_large()
     
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    invalid = [
+        i for i, item in enumerate(items)
+        if not isinstance(item, dict) or not isinstance(item.get("animal"), str) or item["animal"] not in VALID_ANIMALS
+    ]
+    if invalid:
+        raise HTTPException(status_code=400, detail={"message": "Invalid animal selection", "invalid_indexes": invalid[:100]})
     
-    file_info = {
-        "filename": file.filename,
-        "size": len(content),
-        "content_type": file.content_type or "unknown",
-        "timestamp": datetime.now().isoformat(),
-        "path": file_path
+    timestamp = datetime.now().isoformat()
+    entries = [{"animal": item["animal"], "timestamp": timestamp} for item in items]
+    if entries:
+        # Keep ids in arrival order relative to buffered single selections
+        await run_in_threadpool(flush_animal_writes)
+        await run_in_threadpool(storage.add_animals, entries)
+    
+    return {
+        "message": f"{len(entries)} selections recorded",
+        "count": len(entries)
     }
+
+def parse_time_bound(value, name):
+    if value is None:
+        return None
+    try:
+        # Stored timestamps are naive isoformat strings, so they compare as text
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} timestamp")
+
+def history_response(request, iter_records, cursor, limit, since, until, format):
+    since = parse_time_bound(since, "since")
+    until = parse_time_bound(until, "until")
     
-    data = load_data()
-    data["files"].append(file_info)
-    save_data(data)
+    if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        # Records are pulled from storage page by page while the response is sent
+        def lines():
+            # Send lines in batches; one ASGI message per record dominates the cost otherwise
+            batch = []
+            for record_id, record in iter_records(after=cursor, since=since, until=until, limit=limit):
+                batch.append(json.dumps(dict(record, id=record_id)))
+                if len(batch) >= NDJSON_BATCH_LINES:
+                    yield "\n".join(batch) + "\n"
+                    batch = []
+            if batch:
+                yield "\n".join(batch) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
     
+    if limit is None:
+        return {"history": [record for _, record in iter_records(after=cursor, since=since, until=until)]}
+    
+    # One extra row tells us whether there is a next page
+    rows = list(iter_records(after=cursor, since=since, until=until, limit=limit + 1))
+    next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+    return {"history": [record for _, record in rows[:limit]], "next_cursor": next_cursor}
+
+@app.get("/animal/history")
+async def get_animal_history(
+    request: Request,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    format: Optional[str] = None
+):
+    await run_in_threadpool(flush_animal_writes)
+    return await run_in_threadpool(history_response, request, storage.iter_animals, cursor, limit, since, until, format)
+
+def record_upload(filename, content_type, size, sha256, temp_path):
+    file_info = {
+        "filename": filename,
+        "size": size,
+        "content_type": content_type or "unknown",
+        "timestamp": datetime.now().isoformat(),
+        "path": blob_store.path(sha256),
+        "sha256": sha256
+    }
+    # The blob is moved into place under the storage write lock so a concurrent
+    # delete of the last reference can't remove it between the move and the insert
+    storage.add_file(file_info, place=lambda: blob_store.put(temp_path, sha256))
+    return file_info
+
+def upload_response(file_info):
     return {
         "message": "File uploaded successfully",
         "file_info": {
             "name": file_info["filename"],
             "size": file_info["size"],
             "type": file_info["content_type"],
-            "timestamp": file_info["timestamp"]
+            "timestamp": file_info["timestamp"],
+            "sha256": file_info["sha256"]
         }
     }
 
+@app.post("/file/upload")
+async def upload_file(file: UploadFile = File(...)):
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file selected")
+    
+    upload = ChunkedUpload(UPLOADS_DIR, MAX_UPLOAD_BYTES)
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(upload.write, chunk)
+        await run_in_threadpool(upload.close)
+    except UploadTooLarge as e:
+        upload.abort()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        upload.abort()
+        raise
+    
+    file_info = await run_in_threadpool(record_upload, file.filename, file.content_type, upload.size, upload.sha256, upload.temp_path)
+    return upload_response(file_info)
+
+@app.post("/file/uploads")
+async def create_upload_session(request: UploadSessionRequest):
+    if not request.filename:
+        raise HTTPException(status_code=400, detail="No file selected")
+    try:
+        return upload_sessions.create(request.filename, request.size, request.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+@app.get("/file/uploads/{upload_id}")
+async def get_upload_session(upload_id: str):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+@app.patch("/file/uploads/{upload_id}")
+async def append_upload_chunk(upload_id: str, request: Request, upload_offset: int = Header(...)):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    
+    offset = upload_offset
+    buffer = bytearray()
+    try:
+        async for chunk in request.stream():
+            buffer.extend(chunk)
+            if len(buffer) >= CHUNK_SIZE:
+                offset = await run_in_threadpool(upload_sessions.append, upload_id, offset, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            offset = await run_in_threadpool(upload_sessions.append, upload_id, offset, bytes(buffer))
+    except OffsetMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.expected)})
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    
+    if offset < session["size"]:
+        return {"upload_id": upload_id, "offset": offset, "size": session["size"]}
+    
+    try:
+        part_path, sha256 = await run_in_threadpool(upload_sessions.finish, upload_id)
+    except UploadNotFound:
+        # another request completed (or cancelled) this session first
+        raise HTTPException(status_code=404, detail="Upload not found")
+    file_info = await run_in_threadpool(record_upload, session["filename"], session["content_type"], offset, sha256, part_path)
+    return upload_response(file_info)
+
+@app.delete("/file/uploads/{upload_id}")
+async def cancel_upload_session(upload_id: str):
+    if upload_sessions.get(upload_id) is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    upload_sessions.discard(upload_id)
+    return {"message": "Upload cancelled"}
+
 @app.get("/file/history")
-async def get_file_history():
-    data = load_data()
-    return {"history": data["files"]}
+async def get_file_history(
+    request: Request,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    format: Optional[str] = None
+):
+    return await run_in_threadpool(history_response, request, storage.iter_files, cursor, limit, since, until, format)
+
+@app.api_route("/file/{filename}", methods=["GET", "HEAD"])
+async def download_file(filename: str, request: Request):
+    file_info = await run_in_threadpool(storage.latest_file, filename)
+    if file_info is None or not os.path.exists(file_info["path"]):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    # Blobs are content-addressed, so their hash is a strong validator
+    etag = f'"{file_info["sha256"]}"' if file_info.get("sha256") else None
+    content_type = file_info["content_type"] if file_info["content_type"] != "unknown" else None
+    return file_response(request, file_info["path"], etag, media_type=content_type, filename=filename)
 
 @app.delete("/file/{filename}")
 async def delete_file(filename: str):
-    file_path = os.path.join(UPLOADS_DIR, filename)
+    # Blobs shared with other filenames stay on disk until their last record is gone
+    removed = await run_in_threadpool(storage.remove_files, filename, release=remove_if_exists)
     
-    if not os.path.exists(file_path):
+    if not removed:
         raise HTTPException(status_code=404, detail="File not found")
     
-    os.remove(file_path)
-    
-    data = load_data()
-    data["files"] = [f for f in data["files"] if f["filename"] != filename]
-    save_data(data)
-    
     return {"message": f"File {filename} deleted successfully"}
 
 @app.get("/stats")
 async def get_stats():
-    data = load_data()
-    
-    animal_counts = {}
-    for animal_entry in data["animals"]:
-        animal = animal_entry["animal"]
-        animal_counts[animal] = animal_counts.get(animal, 0) + 1
-    
-    total_file_size = sum(f["size"] for f in data["files"])
-    
-    return {
-        "total_animal_selections": len(data["animals"]),
-        "animal_breakdown": animal_counts,
-        "total_files_uploaded": len(data["files"]),
-        "total_file_size_bytes": total_file_size
-    }
+    await run_in_threadpool(flush_animal_writes)
+    return await run_in_threadpool(storage.stats)
 
 if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["rebuild-stats"]:
+        # Recompute the /stats aggregates from the stored history
+        print(json.dumps(storage.rebuild_stats(), indent=2))
+        sys.exit(0)
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,13 +1,70 @@
-from flask import Flask, render_template, request
-from services.openfood_client import search_product, get_product
+import gzip
+import hashlib
+import json
+import os
+
+import requests
+from flask import Flask, Response, jsonify, render_template, request
+from services.cache import LRUCache
+from services.openfood_client import cache_stats, search_product, get_product, get_products, prefetch_products
+from services.scoring import rank_products
+from services.transport import CircuitOpen
 
 app = Flask(__name__)
 
+MAX_BATCH_BARCODES = 50
+
+# Rendered product pages, keyed on barcode and product version. Browsers and
+# proxies may reuse a page for PAGE_MAX_AGE seconds, then revalidate by ETag.
+PAGE_MAX_AGE = int(os.environ.get("PAGE_MAX_AGE", 300))
+GZIP_MIN_BYTES = 512
+page_cache = LRUCache(maxsize=int(os.environ.get("PAGE_CACHE_SIZE", 1024)))
+
+
+class RenderedPage:
+    """
+    A rendered page kept with its gzipped copy and ETag.
+    """
+    __slots__ = ("body", "gzipped", "etag")
+
+    def __init__(self, html):
+        self.body = html.encode("utf-8")
+        self.gzipped = gzip.compress(self.body, 6) if len(self.body) >= GZIP_MIN_BYTES else None
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+
+def _product_version(product):
+    if product is None:
+        return "missing"
+    if product.last_modified_t is not None:
+        return product.last_modified_t
+    return hashlib.sha1(json.dumps(product.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _page_response(page):
+    use_gzip = page.gzipped is not None and request.accept_encodings["gzip"] > 0
+    response = Response(page.gzipped if use_gzip else page.body, mimetype="text/html")
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    # Each encoding is its own representation, so it gets its own ETag
+    response.set_etag(page.etag + ("-gzip" if use_gzip else ""))
+    response.cache_control.public = True
+    response.cache_control.max_age = PAGE_MAX_AGE
+    return response.make_conditional(request)
+
+@app.errorhandler(CircuitOpen)
+@app.errorhandler(requests.RequestException)
+def upstream_unavailable(error):
+    return "The food database is not responding right now. Please try again shortly.", 503
+
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
         query = request.form.get("product_name")
-        results = search_product(query)
+        results = rank_products(search_product(query))
+        prefetch_products([product for product, _ in results])
         return render_template("results.html", query=query, results=results)
     return render_template("index.html")
 
@@ -15,7 +72,33 @@ def index():
 @app.route("/product/<barcode>")
 def product_detail(barcode):
     product = get_product(barcode)
-    return render_template("product.html", product=product)
+    key = (barcode, _product_version(product))
+    page = page_cache.get(key)
+    if page is None:
+        page = RenderedPage(render_template("product.html", product=product))
+        page_cache.set(key, page)
+    return _page_response(page)
+
+
+@app.route("/products")
+def products_compare():
+    barcodes = [b for b in request.args.get("barcodes", "").split(",") if b.strip()]
+    if not barcodes:
+        return "Pass one or more barcodes, e.g. /products?barcodes=3017620422003,5449000000996", 400
+    if len(barcodes) > MAX_BATCH_BARCODES:
+        return f"At most {MAX_BATCH_BARCODES} barcodes per request", 400
+    products, errors = get_products(barcodes)
+    if request.args.get("format") == "json" or request.accept_mimetypes.best == "application/json":
+        return jsonify({
+            "products": {barcode: p.to_dict() if p else None for barcode, p in products.items()},
+            "errors": errors
+        })
+    return render_template("products.html", products=products, errors=errors)
+
+
+@app.route("/cache/stats")
+def cache_statistics():
+    return jsonify(cache_stats())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Load test for the nutrition app against a local OpenFoodFacts stand-in
+
+Starts benchmarks/fake_off.py and the Flask app (threaded werkzeug server) in
+this process, points the app at the stand-in through OFF_BASE_URL, and drives
+each scenario at several concurrency levels over real HTTP. Reports
+throughput, latency percentiles and how many upstream calls each run made.
+
+Usage:
+    python benchmarks/bench_app.py --concurrency 1,8,32 --latency-ms 150
+    python benchmarks/bench_app.py --cold --error-rate 0.05 --scenarios product,search
+
+Results are printed as a table and written to benchmarks/results/ as JSON so
+runs can be compared over time.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from fake_off import DEFAULT_FIXTURES, FakeOpenFoodFacts, load_fixtures
+
+APP_DIR = Path(__file__).resolve().parent.parent
+COMPARE_SIZE = 5
+
+
+def build_scenarios(codes, terms):
+    def search(session, base, rng, state):
+        return session.post(base + "/", data={"product_name": rng.choice(terms)})
+
+    def product(session, base, rng, state):
+        return session.get(f"{base}/product/{rng.choice(codes)}")
+
+    def product_revalidate(session, base, rng, state):
+        # Behaves like a browser that keeps the ETag of pages it has seen
+        code = rng.choice(codes)
+        etag = state.get(code)
+        res = session.get(f"{base}/product/{code}", headers={"If-None-Match": etag} if etag else {})
+        if res.headers.get("ETag"):
+            state[code] = res.headers["ETag"]
+        return res
+
+    def compare(session, base, rng, state):
+        barcodes = ",".join(rng.sample(codes, min(COMPARE_SIZE, len(codes))))
+        return session.get(f"{base}/products", params={"barcodes": barcodes, "format": "json"})
+
+    return {
+        "search": search,
+        "product": product,
+        "product_revalidate": product_revalidate,
+        "compare": compare,
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(base, scenario, concurrency, total, seed):
+    latencies, errors, not_modified = [], 0, 0
+    lock = threading.Lock()
+    remaining = iter(range(total))
+
+    def worker(n):
+        nonlocal errors, not_modified
+        rng, state = random.Random(seed + n), {}
+        with requests.Session() as session:
+            for _ in remaining:
+                started = time.perf_counter()
+                res = scenario(session, base, rng, state)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    errors += res.status_code >= 400
+                    not_modified += res.status_code == 304
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "not_modified": not_modified,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def reset_app_caches(app_module, client):
+    client.cache.memory.clear()
+    app_module.page_cache.clear()
+    if client.prefetcher is not None:
+        client.prefetcher.cancel_pending()
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value):
+    return [int(part) for part in value.split(",") if part]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the nutrition app against a local OpenFoodFacts stand-in")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32], help="concurrent clients, e.g. 1,8,32")
+    parser.add_argument("--requests", type=int, default=300, help="requests per scenario/concurrency")
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios to run")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    parser.add_argument("--synthetic", type=int, default=0, help="extra generated products in the stand-in")
+    parser.add_argument("--latency-ms", type=float, default=100, help="stand-in response latency")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stand-in calls answered with 503")
+    parser.add_argument("--cold", action="store_true", help="clear the app's caches before every run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    output = Path(args.output) if args.output else (
+        APP_DIR / "benchmarks" / "results" / f"app-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+
+    products = load_fixtures(args.fixtures, args.synthetic)
+    fake = FakeOpenFoodFacts(products, args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    fake_server, fake_url = fake.start()
+
+    # openfood_client reads its configuration at import time
+    os.environ["OFF_BASE_URL"] = fake_url
+    os.environ["OFF_BACKEND"] = "remote"
+    os.environ.pop("OFF_CACHE_DIR", None)
+    sys.path.insert(0, str(APP_DIR))
+    from werkzeug.serving import make_server
+    import app as app_module
+    from services import openfood_client
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app_server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=app_server.serve_forever, name="app", daemon=True).start()
+    base = f"http://127.0.0.1:{app_server.server_port}"
+
+    codes = list(products)
+    terms = sorted({p["product_name"].split()[0].lower() for p in products.values() if p.get("product_name")})
+    scenarios = build_scenarios(codes, terms)
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            for name in selected:
+                if args.cold:
+                    reset_app_caches(app_module, openfood_client)
+                fake.reset()
+                stats = run_scenario(base, scenarios[name], concurrency, args.requests, args.seed)
+                upstream = fake.stats()
+                row = {"scenario": name, "concurrency": concurrency, **stats, "upstream": upstream}
+                results.append(row)
+                upstream_calls = sum(v for k, v in upstream.items() if not k.endswith("_errors"))
+                print(
+                    f"{name:<20} c={concurrency:<4} {stats['throughput_rps']:>8} req/s  "
+                    f"p50={stats['p50_ms']:>9}ms  p95={stats['p95_ms']:>9}ms  p99={stats['p99_ms']:>9}ms  "
+                    f"errors={stats['errors']}  304s={stats['not_modified']}  upstream={upstream_calls}"
+                )
+    finally:
+        app_server.shutdown()
+        fake_server.shutdown()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "products": len(products),
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "cold": args.cold,
+            "requests_per_run": args.requests,
+        },
+        "results": results,
+        "cache": openfood_client.cache_stats(),
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
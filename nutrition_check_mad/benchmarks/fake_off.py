@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenFoodFacts API
+
+Serves the two endpoints the app uses (product by barcode and search) from a
+fixture file of recorded products, with optional added latency and injected
+errors, and counts every call so benchmarks can report upstream traffic.
+
+Usage:
+    python benchmarks/fake_off.py serve --port 8099 --latency-ms 150 --error-rate 0.02
+    OFF_BASE_URL=http://127.0.0.1:8099 python app.py
+
+    # refresh the fixtures from the real API
+    python benchmarks/fake_off.py record --barcodes 3017620422003,5449000000996 --search nutella
+
+GET /__stats returns the call counters; POST /__reset clears them.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "products.json"
+PRODUCT_PATH = re.compile(r"^/api/v0/product/([^/]+)\.json$")
+
+
+def load_fixtures(path, synthetic=0):
+    """
+    Products keyed by barcode. ``synthetic`` adds that many generated
+    variants of the recorded ones, for a catalogue larger than the caches.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        recorded = json.load(f)["products"]
+    products = {p["code"]: p for p in recorded}
+    for i in range(synthetic):
+        base = recorded[i % len(recorded)]
+        code = f"99{i:011d}"
+        products[code] = dict(base, code=code, product_name=f"{base['product_name']} #{i}")
+    return products
+
+
+class FakeOpenFoodFacts:
+    """
+    Fixture-backed responses with ``latency_ms`` (+ up to ``jitter_ms``)
+    delay and an ``error_rate`` share of 503s.
+    """
+
+    def __init__(self, products, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=None):
+        self.products = products
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def delay_and_fail(self):
+        """
+        Sleep for the configured latency; True if this call should fail.
+        """
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms)
+            fail = self._random.random() < self.error_rate
+        time.sleep((self.latency_ms + jitter) / 1000)
+        return fail
+
+    @staticmethod
+    def _project(product, fields):
+        if not fields:
+            return product
+        wanted = fields.split(",")
+        return {k: v for k, v in product.items() if k in wanted}
+
+    def product(self, barcode, params):
+        product = self.products.get(barcode)
+        if product is None:
+            return {"code": barcode, "status": 0, "status_verbose": "product not found"}
+        return {"code": barcode, "status": 1, "product": self._project(product, params.get("fields"))}
+
+    def search(self, params):
+        terms = (params.get("search_terms") or "").lower().split()
+        page_size = int(params.get("page_size") or 24)
+        matches = [
+            p for p in self.products.values()
+            if all(t in f"{p.get('product_name', '')} {p.get('brands', '')}".lower() for t in terms)
+        ]
+        page = [self._project(p, params.get("fields")) for p in matches[:page_size]]
+        return {"count": len(matches), "page": 1, "page_size": page_size, "products": page}
+
+    def make_server(self, host="127.0.0.1", port=0):
+        return ThreadingHTTPServer((host, port), _handler_for(self))
+
+    def start(self, host="127.0.0.1", port=0):
+        """
+        Serve on a daemon thread; returns ``(server, base_url)``.
+        """
+        server = self.make_server(host, port)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="fake-off", daemon=True).start()
+        return server, f"http://{host}:{server.server_address[1]}"
+
+
+def _handler_for(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == "/__stats":
+                return self._send_json(200, fake.stats())
+            match = PRODUCT_PATH.match(url.path)
+            if match:
+                name, respond = "product", lambda: fake.product(match.group(1), params)
+            elif url.path == "/cgi/search.pl":
+                name, respond = "search", lambda: fake.search(params)
+            else:
+                return self._send_json(404, {"error": "unknown path"})
+            fake.count(name)
+            if fake.delay_and_fail():
+                fake.count(name + "_errors")
+                return self._send_json(503, {"error": "injected failure"})
+            self._send_json(200, respond())
+
+        def do_POST(self):
+            if urlsplit(self.path).path != "/__reset":
+                return self._send_json(404, {"error": "unknown path"})
+            fake.reset()
+            self._send_json(200, {})
+
+    return Handler
+
+
+def record(args):
+    import requests
+
+    session = requests.Session()
+    session.headers["User-Agent"] = "nutrition-check-mad-fixtures/1.0"
+    products = {}
+    if args.output.exists():
+        products = {p["code"]: p for p in json.loads(args.output.read_text(encoding="utf-8"))["products"]}
+    for barcode in filter(None, args.barcodes.split(",")):
+        res = session.get(f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json", timeout=10)
+        res.raise_for_status()
+        product = res.json().get("product")
+        if product:
+            products[product["code"]] = product
+    for query in args.search:
+        res = session.get(
+            "https://world.openfoodfacts.org/cgi/search.pl",
+            params={"search_terms": query, "search_simple": 1, "action": "process", "json": 1, "page_size": 20},
+            timeout=10,
+        )
+        res.raise_for_status()
+        for product in res.json().get("products", []):
+            if product.get("code"):
+                products[product["code"]] = product
+    args.output.write_text(json.dumps({"products": list(products.values())}, indent=1, ensure_ascii=False))
+    print(f"{len(products)} products written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenFoodFacts stand-in")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="serve the fixtures over HTTP")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8099)
+    serve.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    serve.add_argument("--synthetic", type=int, default=0, help="extra generated products")
+    serve.add_argument("--latency-ms", type=float, default=0)
+    serve.add_argument("--jitter-ms", type=float, default=0)
+    serve.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with 503")
+    serve.add_argument("--seed", type=int)
+
+    rec = commands.add_parser("record", help="fetch products from the real API into the fixture file")
+    rec.add_argument("--barcodes", default="")
+    rec.add_argument("--search", action="append", default=[], help="search query to record (repeatable)")
+    rec.add_argument("--output", type=Path, default=DEFAULT_FIXTURES)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        return record(args)
+
+    fake = FakeOpenFoodFacts(
+        load_fixtures(args.fixtures, args.synthetic), args.latency_ms, args.jitter_ms, args.error_rate, args.seed
+    )
+    server = fake.make_server(args.host, args.port)
+    print(f"Serving {len(fake.products)} products on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
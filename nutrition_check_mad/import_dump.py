@@ -0,0 +1,46 @@
+"""
+Import an OpenFoodFacts data dump into the local product index.
+
+    python import_dump.py openfoodfacts-products.jsonl.gz
+    python import_dump.py en.openfoodfacts.org.products.csv.gz --db products.db
+    python import_dump.py delta.jsonl.gz            # apply a delta export
+
+The dump is streamed record by record, so memory use stays flat however
+large it is. Products already stored with the same or a newer
+last_modified_t are skipped unless --force is given.
+
+Serve from the index with OFF_BACKEND=local (or local-first) and
+OFF_LOCAL_DB=<path>.
+"""
+import argparse
+import sys
+import time
+
+from services.local_index import LocalIndex, iter_csv, iter_jsonl, open_dump
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("dump", help="JSONL or tab-separated CSV dump, optionally .gz")
+    parser.add_argument("--db", default="products.db", help="index file to create or update")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="dump format (default: from the file name)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="products per transaction")
+    parser.add_argument("--force", action="store_true", help="overwrite products even if not newer")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if ".csv" in args.dump else "jsonl")
+    started = time.time()
+
+    def progress(written, skipped):
+        rate = (written + skipped) / max(time.time() - started, 1e-6)
+        print(f"\r{written} written, {skipped} skipped ({rate:.0f}/s)", end="", file=sys.stderr)
+
+    index = LocalIndex(args.db)
+    with open_dump(args.dump) as stream:
+        products = iter_csv(stream) if fmt == "csv" else iter_jsonl(stream)
+        written, skipped = index.import_products(products, args.batch_size, args.force, progress)
+    print(f"\nImported {written} products ({skipped} unchanged) in {time.time() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Entry:
+    """
+    A cached value with the time it stops being fresh and the time it
+    stops being servable at all.
+    """
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU bounded by entry count.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    One JSON file per key under ``directory``, written atomically so several
+    worker processes can share it. ``encode``/``decode`` convert values to and
+    from JSON-compatible data.
+
+    Each file's mtime is set to the entry's ``stale_until``, so expired
+    entries can be found from a directory scan alone. At most every
+    ``sweep_interval`` seconds a write deletes expired entries and, past
+    ``max_entries``, the ones expiring soonest. Unreadable entries are
+    deleted and treated as misses.
+    """
+
+    def __init__(self, directory, encode=None, decode=None, max_entries=None, sweep_interval=600):
+        self.directory = directory
+        self.encode = encode or (lambda value: value)
+        self.decode = decode or (lambda value: value)
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+        self._sweep_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".json")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self._remove(path)
+            return None
+        try:
+            entry = Entry(self.decode(data["value"]), float(data["fresh_until"]), float(data["stale_until"]))
+        except (KeyError, TypeError, ValueError):
+            self._remove(path)
+            return None
+        # Expired entries are still returned (TieredCache may serve them when a
+        # reload fails) until a sweep deletes them
+        return entry
+
+    def set(self, key, entry):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"value": self.encode(entry.value), "fresh_until": entry.fresh_until, "stale_until": entry.stale_until}, f)
+            os.utime(tmp_path, (time.time(), entry.stale_until))
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self._maybe_sweep()
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            self.sweep()
+        finally:
+            self._sweep_lock.release()
+
+    def sweep(self):
+        """
+        Delete expired entries and leftover temp files, then the soonest-expiring
+        entries beyond ``max_entries``. Returns how many files were removed.
+        """
+        now = time.time()
+        removed = 0
+        live = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                try:
+                    expires = item.stat().st_mtime
+                except OSError:
+                    continue
+                # Temp files of interrupted writes carry the real write time until renamed
+                abandoned = item.name.endswith(".tmp") and expires < now - self.sweep_interval
+                if expires <= now or abandoned:
+                    self._remove(item.path)
+                    removed += 1
+                elif item.name.endswith(".json"):
+                    live.append((expires, item.path))
+        if self.max_entries is not None and len(live) > self.max_entries:
+            live.sort()
+            for _, path in live[:len(live) - self.max_entries]:
+                self._remove(path)
+                removed += 1
+        return removed
+
+
+class TieredCache:
+    """
+    Memory LRU in front of an optional disk cache, with stale-while-revalidate.
+
+    Fresh entries are returned directly. Entries past their TTL but inside
+    the stale window are returned immediately while one background refresh
+    per key reloads them. If a load fails, any cached copy is served instead
+    of the error.
+    """
+
+    def __init__(self, memory, disk=None, refresh_workers=2):
+        self.memory = memory
+        self.disk = disk
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+
+    def _lookup(self, key):
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        return entry
+
+    def _store(self, key, value, ttl, stale_ttl):
+        now = time.time()
+        entry = Entry(value, now + ttl, now + ttl + stale_ttl)
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, entry)
+            except OSError:
+                pass
+        return entry
+
+    def _count(self, kind, outcome):
+        with self._lock:
+            self._counters[kind][outcome] += 1
+
+    def _refresh(self, kind, key, loader, ttl, stale_ttl):
+        try:
+            self._store(key, loader(), ttl, stale_ttl)
+        except Exception:
+            self._count(kind, "refresh_errors")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _serve_cached(self, kind, key, entry, start_refresh):
+        now = time.time()
+        if entry is not None and now < entry.fresh_until:
+            self._count(kind, "hits")
+            return True
+        if entry is not None and now < entry.stale_until:
+            self._count(kind, "stale_hits")
+            with self._lock:
+                claimed = key not in self._refreshing
+                self._refreshing.add(key)
+            if claimed:
+                start_refresh()
+            return True
+        self._count(kind, "misses")
+        return False
+
+    def _fallback(self, kind, entry):
+        if entry is None:
+            return False
+        self._count(kind, "stale_on_error")
+        return True
+
+    def is_fresh(self, kind, key):
+        """
+        Whether ``key`` has a fresh entry, without touching the hit counters.
+        """
+        entry = self._lookup((kind,) + tuple(key))
+        return entry is not None and time.time() < entry.fresh_until
+
+    def get_or_load(self, kind, key, loader, ttl, stale_ttl=0):
+        """
+        Return the cached value for ``key``, calling ``loader()`` when needed.
+        """
+        key = (kind,) + tuple(key)
+        entry = self._lookup(key)
+        start_refresh = lambda: self._refresher.submit(self._refresh, kind, key, loader, ttl, stale_ttl)
+        if self._serve_cached(kind, key, entry, start_refresh):
+            return entry.value
+        try:
+            value = loader()
+        except Exception:
+            if not self._fallback(kind, entry):
+                raise
+            return entry.value
+        return self._store(key, value, ttl, stale_ttl).value
+
+    async def _refresh_async(self, kind, key, loader, ttl, stale_ttl):
+        try:
+            self._store(key, await loader(), ttl, stale_ttl)
+        except Exception:
+            self._count(kind, "refresh_errors")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def get_or_load_async(self, kind, key, loader, ttl, stale_ttl=0):
+        """
+        Same as :meth:`get_or_load` for a coroutine ``loader``.
+        """
+        key = (kind,) + tuple(key)
+        entry = self._lookup(key)
+        start_refresh = lambda: asyncio.ensure_future(self._refresh_async(kind, key, loader, ttl, stale_ttl))
+        if self._serve_cached(kind, key, entry, start_refresh):
+            return entry.value
+        try:
+            value = await loader()
+        except Exception:
+            if not self._fallback(kind, entry):
+                raise
+            return entry.value
+        return self._store(key, value, ttl, stale_ttl).value
+
+    def stats(self):
+        with self._lock:
+            counters = {kind: dict(values) for kind, values in self._counters.items()}
+        return {"memory_entries": len(self.memory), "by_kind": counters}
@@ -0,0 +1,170 @@
+import csv
+import gzip
+import io
+import json
+import sqlite3
+import threading
+
+from services.product import Product
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    code TEXT PRIMARY KEY,
+    product_name TEXT,
+    brands TEXT,
+    last_modified_t INTEGER,
+    data TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    product_name, brands, content='products', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS products_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts(rowid, product_name, brands) VALUES (new.rowid, new.product_name, new.brands);
+END;
+CREATE TRIGGER IF NOT EXISTS products_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, product_name, brands)
+    VALUES ('delete', old.rowid, old.product_name, old.brands);
+END;
+CREATE TRIGGER IF NOT EXISTS products_au AFTER UPDATE ON products BEGIN
+    INSERT INTO products_fts(products_fts, rowid, product_name, brands)
+    VALUES ('delete', old.rowid, old.product_name, old.brands);
+    INSERT INTO products_fts(rowid, product_name, brands) VALUES (new.rowid, new.product_name, new.brands);
+END;
+"""
+
+
+def _to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def iter_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_csv(stream):
+    """
+    Rows of the tab-separated OpenFoodFacts CSV export, shaped like API
+    products (``*_100g`` columns become ``nutriments``).
+    """
+    csv.field_size_limit(1 << 24)
+    for row in csv.DictReader(stream, delimiter="\t", quoting=csv.QUOTE_NONE):
+        product = {k: v for k, v in row.items() if k and not k.endswith("_100g")}
+        product["nutriments"] = {k: _to_number(v) for k, v in row.items() if k and k.endswith("_100g") and v}
+        product["nutrition_grades"] = row.get("nutriscore_grade") or row.get("nutrition_grade_fr")
+        modified = row.get("last_modified_t") or ""
+        product["last_modified_t"] = int(modified) if modified.isdigit() else None
+        yield product
+
+
+def open_dump(path):
+    """
+    Open a (optionally gzipped) dump for streaming text reads.
+    """
+    raw = gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+    return io.TextIOWrapper(raw, encoding="utf-8", errors="replace", newline="")
+
+
+class LocalIndex:
+    """
+    On-disk product store: primary key on barcode plus an FTS5 index on
+    product names and brands. Each thread gets its own connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def get(self, barcode):
+        row = self._conn().execute("SELECT data FROM products WHERE code = ?", (barcode,)).fetchone()
+        return Product.from_dict(json.loads(row[0])) if row else None
+
+    def search(self, query, page_size=5):
+        terms = [term.replace('"', '""') for term in query.split()]
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"*' for term in terms)
+        rows = self._conn().execute(
+            "SELECT p.data FROM products_fts f JOIN products p ON p.rowid = f.rowid "
+            "WHERE products_fts MATCH ? ORDER BY f.rank LIMIT ?",
+            (match, page_size),
+        ).fetchall()
+        return [Product.from_dict(json.loads(row[0])) for row in rows]
+
+    def import_products(self, products, batch_size=1000, force=False, progress=None):
+        """
+        Upsert products from an iterable, committing every ``batch_size``.
+
+        Unless ``force`` is set, a product is skipped when the stored copy is
+        at least as recent (``last_modified_t``), so delta dumps can be
+        applied repeatedly. Returns ``(written, skipped)``.
+        """
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        written = skipped = 0
+        batch = []
+
+        def flush():
+            nonlocal written, skipped
+            with conn:
+                for record in batch:
+                    if not force:
+                        row = conn.execute(
+                            "SELECT last_modified_t FROM products WHERE code = ?", (record["code"],)
+                        ).fetchone()
+                        if row and row[0] is not None and (record.get("last_modified_t") or 0) <= row[0]:
+                            skipped += 1
+                            continue
+                    values = (
+                        record.get("product_name"),
+                        record.get("brands"),
+                        record.get("last_modified_t"),
+                        json.dumps(record, separators=(",", ":")),
+                        record["code"],
+                    )
+                    # UPDATE-then-INSERT rather than INSERT OR REPLACE, whose implicit
+                    # delete would skip the FTS delete trigger
+                    updated = conn.execute(
+                        "UPDATE products SET product_name = ?, brands = ?, last_modified_t = ?, data = ? WHERE code = ?",
+                        values,
+                    ).rowcount
+                    if not updated:
+                        conn.execute(
+                            "INSERT INTO products (product_name, brands, last_modified_t, data, code) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            values,
+                        )
+                    written += 1
+            batch.clear()
+            if progress:
+                progress(written, skipped)
+
+        try:
+            for data in products:
+                # Only the compact record is stored; a full dump record is often hundreds of KB
+                product = Product.from_api(data)
+                if product is None:
+                    continue
+                batch.append(product.to_dict())
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+        finally:
+            conn.close()
+        return written, skipped
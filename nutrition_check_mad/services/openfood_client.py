@@ -1,28 +1,215 @@
-import requests
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-BASE_URL = "https://world.openfoodfacts.org/api/v0/product/{}.json"
-SEARCH_URL = "https://world.openfoodfacts.org/cgi/search.pl"
+from services.cache import DiskCache, LRUCache, TieredCache
+from services.local_index import LocalIndex
+from services.prefetch import Prefetcher
+from services.product import API_FIELDS, Product
+from services.transport import AsyncTransport, CircuitBreaker, Transport
 
-def search_product(query, page_size=5):
-    """
-    Search products by name.
-    """
-    params = {
+# Point OFF_BASE_URL at a stand-in (see benchmarks/fake_off.py) to run offline.
+OFF_BASE_URL = os.environ.get("OFF_BASE_URL", "https://world.openfoodfacts.org").rstrip("/")
+BASE_URL = OFF_BASE_URL + "/api/v0/product/{}.json"
+SEARCH_URL = OFF_BASE_URL + "/cgi/search.pl"
+
+# "remote" (default) calls the OpenFoodFacts API, "local" serves only from the
+# index built by import_dump.py, "local-first" falls back to the API on a miss.
+BACKEND = os.environ.get("OFF_BACKEND", "remote")
+local_index = LocalIndex(os.environ.get("OFF_LOCAL_DB", "products.db")) if BACKEND != "remote" else None
+
+# Seconds a response is fresh, then how long a stale copy may still be served
+# while it is refreshed in the background.
+CACHE_TTLS = {
+    "product": (24 * 3600, 7 * 24 * 3600),
+    "search": (3600, 24 * 3600),
+}
+
+
+def _encode(value):
+    if isinstance(value, list):
+        return [p.to_dict() for p in value]
+    return value.to_dict() if value is not None else None
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [Product.from_dict(p) for p in value]
+    return Product.from_dict(value) if value is not None else None
+
+
+# Set OFF_CACHE_DIR to keep cached responses on disk across restarts/workers;
+# OFF_CACHE_MAX_ENTRIES bounds how many files it keeps.
+_cache_dir = os.environ.get("OFF_CACHE_DIR")
+cache = TieredCache(
+    LRUCache(maxsize=int(os.environ.get("OFF_CACHE_SIZE", 2048))),
+    DiskCache(
+        _cache_dir, encode=_encode, decode=_decode,
+        max_entries=int(os.environ.get("OFF_CACHE_MAX_ENTRIES", 50000)),
+    ) if _cache_dir else None,
+)
+
+TRANSPORT_OPTIONS = {
+    "timeout": (float(os.environ.get("OFF_CONNECT_TIMEOUT", 3.05)), float(os.environ.get("OFF_READ_TIMEOUT", 10))),
+    "retries": int(os.environ.get("OFF_RETRIES", 2)),
+    "pool_size": int(os.environ.get("OFF_POOL_SIZE", 20)),
+}
+
+# Shared by the sync and async transports: both talk to the same upstream.
+breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get("OFF_BREAKER_THRESHOLD", 5)),
+    reset_timeout=float(os.environ.get("OFF_BREAKER_RESET", 30)),
+)
+transport = Transport(breaker=breaker, **TRANSPORT_OPTIONS)
+_async_transport = None
+
+# Bounds how many upstream lookups get_products runs at once across all requests.
+BATCH_CONCURRENCY = int(os.environ.get("OFF_BATCH_CONCURRENCY", 8))
+_batch_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="off-batch")
+
+
+def _get_async_transport():
+    global _async_transport
+    if _async_transport is None:
+        _async_transport = AsyncTransport(breaker=breaker, **TRANSPORT_OPTIONS)
+    return _async_transport
+
+
+def _normalize_query(query):
+    return " ".join((query or "").lower().split())
+
+
+def _search_params(query, page_size):
+    return {
         "search_terms": query,
         "search_simple": 1,
         "action": "process",
         "json": 1,
-        "page_size": page_size
+        "page_size": page_size,
+        "fields": API_FIELDS
     }
-    res = requests.get(SEARCH_URL, params=params)
-    res.raise_for_status()
-    return res.json().get("products", [])
+
+
+def _products(data):
+    return [p for p in map(Product.from_api, data.get("products", [])) if p is not None]
+
+
+def search_product(query, page_size=5):
+    """
+    Search products by name. Returns a list of compact Product records.
+    """
+    query = _normalize_query(query)
+    if local_index is not None:
+        results = local_index.search(query, page_size)
+        if results or BACKEND == "local":
+            return results
+    ttl, stale_ttl = CACHE_TTLS["search"]
+
+    def load():
+        return _products(transport.get_json(SEARCH_URL, params=_search_params(query, page_size)))
+
+    return cache.get_or_load("search", (query, int(page_size)), load, ttl, stale_ttl)
 
 
 def get_product(barcode):
     """
-    Get product details by barcode.
+    Get product details by barcode. Returns a Product, or None if unknown.
+    """
+    barcode = str(barcode).strip()
+    if local_index is not None:
+        product = local_index.get(barcode)
+        if product is not None or BACKEND == "local":
+            return product
+    ttl, stale_ttl = CACHE_TTLS["product"]
+
+    def load():
+        data = transport.get_json(BASE_URL.format(barcode), params={"fields": API_FIELDS})
+        return Product.from_api(data.get("product"))
+
+    return cache.get_or_load("product", (barcode,), load, ttl, stale_ttl)
+
+
+async def search_product_async(query, page_size=5):
+    """
+    Async variant of search_product for use inside an event loop.
+    """
+    query = _normalize_query(query)
+    if local_index is not None:
+        results = local_index.search(query, page_size)
+        if results or BACKEND == "local":
+            return results
+    ttl, stale_ttl = CACHE_TTLS["search"]
+
+    async def load():
+        return _products(await _get_async_transport().get_json(SEARCH_URL, params=_search_params(query, page_size)))
+
+    return await cache.get_or_load_async("search", (query, int(page_size)), load, ttl, stale_ttl)
+
+
+async def get_product_async(barcode):
+    """
+    Async variant of get_product for use inside an event loop.
+    """
+    barcode = str(barcode).strip()
+    if local_index is not None:
+        product = local_index.get(barcode)
+        if product is not None or BACKEND == "local":
+            return product
+    ttl, stale_ttl = CACHE_TTLS["product"]
+
+    async def load():
+        data = await _get_async_transport().get_json(BASE_URL.format(barcode), params={"fields": API_FIELDS})
+        return Product.from_api(data.get("product"))
+
+    return await cache.get_or_load_async("product", (barcode,), load, ttl, stale_ttl)
+
+
+# Warms the product cache for the top search results in the background, since
+# users usually click one of them next. OFF_PREFETCH_TOP_K=0 disables it.
+PREFETCH_TOP_K = int(os.environ.get("OFF_PREFETCH_TOP_K", 3))
+prefetcher = Prefetcher(
+    fetch=lambda barcode: get_product(barcode),
+    is_cached=lambda barcode: cache.is_fresh("product", (barcode,)),
+    # Leave a failing upstream alone; foreground requests get what capacity it has
+    should_run=lambda: breaker.state == "closed",
+    workers=int(os.environ.get("OFF_PREFETCH_WORKERS", 2)),
+    rate=float(os.environ.get("OFF_PREFETCH_RATE", 5)),
+    burst=int(os.environ.get("OFF_PREFETCH_BURST", 10)),
+) if PREFETCH_TOP_K > 0 and BACKEND != "local" else None
+
+
+def prefetch_products(products):
+    """
+    Queue background lookups for the first PREFETCH_TOP_K products.
+    """
+    if prefetcher is None:
+        return 0
+    return prefetcher.submit([p.code for p in products[:PREFETCH_TOP_K]])
+
+
+def get_products(barcodes):
+    """
+    Look up several barcodes concurrently.
+
+    Duplicates are fetched once. Returns ``(products, errors)``: products maps
+    barcode to product in input order, errors maps barcode to a message for
+    lookups that failed, so one bad item doesn't sink the batch.
+    """
+    unique = list(dict.fromkeys(str(b).strip() for b in barcodes if str(b).strip()))
+    futures = [(barcode, _batch_pool.submit(get_product, barcode)) for barcode in unique]
+    products, errors = {}, {}
+    for barcode, future in futures:
+        try:
+            products[barcode] = future.result()
+        except Exception as e:
+            errors[barcode] = str(e) or type(e).__name__
+    return products, errors
+
+
+def cache_stats():
+    """
+    Hit/miss counters for the response cache and the prefetcher.
     """
-    res = requests.get(BASE_URL.format(barcode))
-    res.raise_for_status()
-    return res.json().get("product", {})
+    stats = cache.stats()
+    if prefetcher is not None:
+        stats["prefetch"] = prefetcher.stats()
+    return stats
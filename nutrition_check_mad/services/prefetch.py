@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` operations per second on average, up to ``burst`` at once.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class Prefetcher:
+    """
+    Warms a cache in the background by calling ``fetch(key)`` on a small
+    worker pool.
+
+    Prefetching is best effort and never blocks the caller: keys that are
+    already cached (``is_cached``) or in flight are skipped, keys beyond the
+    rate limit are dropped, and once more than ``max_pending`` keys are
+    queued the oldest queued ones are cancelled in favour of the newest.
+    ``should_run`` is checked before each fetch so work can be shed when
+    upstream is unhealthy.
+    """
+
+    def __init__(self, fetch, is_cached=None, should_run=None, workers=2, max_pending=32, rate=5.0, burst=10):
+        self.fetch = fetch
+        self.is_cached = is_cached or (lambda key: False)
+        self.should_run = should_run or (lambda: True)
+        self.max_pending = max_pending
+        self._bucket = TokenBucket(rate, burst)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._pending = deque()
+        self._keys = set()
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "skipped": 0, "rate_limited": 0, "cancelled": 0, "fetched": 0, "errors": 0}
+
+    def _count(self, outcome, n=1):
+        with self._lock:
+            self._counters[outcome] += n
+
+    def _run(self, key):
+        try:
+            if not self.should_run():
+                self._count("skipped")
+                return
+            self.fetch(key)
+            self._count("fetched")
+        except Exception:
+            self._count("errors")
+        finally:
+            with self._lock:
+                self._keys.discard(key)
+
+    def submit(self, keys):
+        """
+        Queue ``keys`` for prefetching, most important first. Returns how
+        many were queued.
+        """
+        queued = 0
+        for key in keys:
+            with self._lock:
+                busy = key in self._keys
+            if busy or self.is_cached(key):
+                self._count("skipped")
+                continue
+            if not self._bucket.try_acquire():
+                self._count("rate_limited")
+                break
+            with self._lock:
+                self._keys.add(key)
+                self._pending.append((key, self._pool.submit(self._run, key)))
+                self._counters["submitted"] += 1
+            queued += 1
+        self._trim()
+        return queued
+
+    def _trim(self):
+        with self._lock:
+            while self._pending and self._pending[0][1].done():
+                self._pending.popleft()
+            stale = []
+            while len(self._pending) > self.max_pending:
+                stale.append(self._pending.popleft())
+        for key, future in stale:
+            if future.cancel():
+                with self._lock:
+                    self._keys.discard(key)
+                self._count("cancelled")
+
+    def cancel_pending(self):
+        """
+        Drop every queued key that has not started yet.
+        """
+        with self._lock:
+            pending, self._pending = list(self._pending), deque()
+        for key, future in pending:
+            if future.cancel():
+                with self._lock:
+                    self._keys.discard(key)
+                self._count("cancelled")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._keys))
+
+    def shutdown(self):
+        self.cancel_pending()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,66 @@
+PRODUCT_FIELDS = ("code", "product_name", "brands", "image_url", "nutrition_grades", "nutriments", "last_modified_t")
+
+# Per-100g values the app renders or scores; everything else is dropped.
+NUTRIMENT_KEYS = (
+    "energy-kcal_100g",
+    "energy_100g",
+    "fat_100g",
+    "saturated-fat_100g",
+    "sugars_100g",
+    "fiber_100g",
+    "proteins_100g",
+    "salt_100g",
+    "sodium_100g",
+)
+
+# Asked of the API so it doesn't send the full record
+API_FIELDS = ",".join(PRODUCT_FIELDS)
+
+
+class Product:
+    """
+    Compact product record: the handful of fields the templates use, with
+    ``__slots__`` so thousands of cached products stay small.
+    """
+    __slots__ = PRODUCT_FIELDS
+
+    def __init__(self, code, product_name=None, brands=None, image_url=None, nutrition_grades=None,
+                 nutriments=None, last_modified_t=None):
+        self.code = code
+        self.product_name = product_name
+        self.brands = brands
+        self.image_url = image_url
+        self.nutrition_grades = nutrition_grades
+        self.nutriments = nutriments or {}
+        self.last_modified_t = last_modified_t
+
+    @classmethod
+    def from_api(cls, data):
+        """
+        Build from an OpenFoodFacts product dict; ``None`` if it has no barcode.
+        """
+        if not data or not data.get("code"):
+            return None
+        nutriments = data.get("nutriments") or {}
+        return cls(
+            code=str(data["code"]),
+            product_name=data.get("product_name") or None,
+            brands=data.get("brands") or None,
+            image_url=data.get("image_url") or None,
+            nutrition_grades=data.get("nutrition_grades") or None,
+            nutriments={k: nutriments[k] for k in NUTRIMENT_KEYS if nutriments.get(k) not in (None, "")},
+            last_modified_t=data.get("last_modified_t"),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in PRODUCT_FIELDS})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in PRODUCT_FIELDS}
+
+    def __eq__(self, other):
+        return isinstance(other, Product) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Product(code={self.code!r}, product_name={self.product_name!r})"
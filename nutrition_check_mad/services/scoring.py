@@ -0,0 +1,131 @@
+import numpy as np
+
+# Nutri-Score (general foods) point thresholds: one point per threshold the
+# per-100g value exceeds.
+ENERGY_KJ = np.array([335, 670, 1005, 1340, 1675, 2010, 2345, 2680, 3015, 3350])
+SUGARS_G = np.array([4.5, 9, 13.5, 18, 22.5, 27, 31, 36, 40, 45])
+SATURATED_FAT_G = np.arange(1, 11)
+SODIUM_MG = np.arange(90, 901, 90)
+FIBER_G = np.array([0.9, 1.9, 2.8, 3.7, 4.7])
+PROTEINS_G = np.array([1.6, 3.2, 4.8, 6.4, 8.0])
+
+# Upper score bound of grades a..d; anything higher is e.
+GRADE_BOUNDS = np.array([-1, 2, 10, 18])
+GRADES = np.array(list("abcde"))
+
+# Columns of the nutriment matrix.
+COLUMNS = ("energy_kj", "sugars", "saturated_fat", "sodium_mg", "fiber", "proteins")
+
+
+class Score:
+    """
+    Scoring annotations for one product in a batch.
+    """
+    __slots__ = ("score", "grade", "density", "density_rank", "alternative")
+
+    def __init__(self, score, grade, density, density_rank, alternative):
+        self.score = score
+        self.grade = grade
+        self.density = density
+        self.density_rank = density_rank
+        self.alternative = alternative
+
+
+def _column(products, key):
+    values = np.full(len(products), np.nan)
+    for i, product in enumerate(products):
+        value = product.nutriments.get(key)
+        if isinstance(value, (int, float)):
+            values[i] = value
+    return values
+
+
+def nutriment_matrix(products):
+    """
+    Per-100g nutriments as an ``(n, len(COLUMNS))`` float array, NaN where
+    unknown. Energy falls back to kcal and sodium to salt.
+    """
+    kcal = _column(products, "energy-kcal_100g")
+    energy = _column(products, "energy_100g")
+    energy = np.where(np.isnan(energy), kcal * 4.184, energy)
+    sodium = _column(products, "sodium_100g")
+    sodium = np.where(np.isnan(sodium), _column(products, "salt_100g") / 2.5, sodium) * 1000
+    return np.column_stack([
+        energy,
+        _column(products, "sugars_100g"),
+        _column(products, "saturated-fat_100g"),
+        sodium,
+        _column(products, "fiber_100g"),
+        _column(products, "proteins_100g"),
+    ])
+
+
+def _points(values, thresholds):
+    return np.searchsorted(thresholds, np.nan_to_num(values), side="left")
+
+
+def nutrition_scores(matrix):
+    """
+    Nutri-Score points for each row (lower is better); NaN when energy is
+    unknown. Other missing nutrients count as zero.
+    """
+    energy, sugars, saturated_fat, sodium, fiber, proteins = matrix.T
+    negative = (
+        _points(energy, ENERGY_KJ)
+        + _points(sugars, SUGARS_G)
+        + _points(saturated_fat, SATURATED_FAT_G)
+        + _points(sodium, SODIUM_MG)
+    )
+    protein_points = np.where(negative >= 11, 0, _points(proteins, PROTEINS_G))
+    scores = (negative - _points(fiber, FIBER_G) - protein_points).astype(float)
+    scores[np.isnan(energy)] = np.nan
+    return scores
+
+
+def nutrient_density(matrix):
+    """
+    Grams of protein plus fibre per 100 kcal; NaN when energy is unknown.
+    """
+    kcal = matrix[:, 0] / 4.184
+    useful = np.nan_to_num(matrix[:, 5]) + np.nan_to_num(matrix[:, 4])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(kcal > 0, useful / kcal * 100, np.nan)
+
+
+def rank_products(products):
+    """
+    Score a batch of Products and return ``(product, Score)`` pairs, best
+    nutrition score first and unscored products last.
+
+    Each product's alternative is the best-scoring other product in the
+    batch when that one scores strictly better, else None.
+    """
+    if not products:
+        return []
+    matrix = nutriment_matrix(products)
+    scores = nutrition_scores(matrix)
+    density = nutrient_density(matrix)
+
+    # argsort puts NaN last; stable so upstream relevance breaks ties
+    order = np.argsort(scores, kind="stable")
+    density_order = np.argsort(-np.nan_to_num(density, nan=-np.inf), kind="stable")
+    density_rank = np.empty(len(products), dtype=int)
+    density_rank[density_order] = np.arange(1, len(products) + 1)
+
+    best = order[0]
+    runner_up = order[1] if len(order) > 1 else best
+    alternatives = np.where(np.arange(len(products)) == best, runner_up, best)
+    has_alternative = scores[alternatives] < scores
+    grades = GRADES[np.searchsorted(GRADE_BOUNDS, np.nan_to_num(scores), side="left")]
+
+    ranked = []
+    for i in order:
+        scored = not np.isnan(scores[i])
+        ranked.append((products[i], Score(
+            score=int(scores[i]) if scored else None,
+            grade=str(grades[i]) if scored else None,
+            density=round(float(density[i]), 1) if not np.isnan(density[i]) else None,
+            density_rank=int(density_rank[i]) if not np.isnan(density[i]) else None,
+            alternative=products[alternatives[i]] if has_alternative[i] else None,
+        )))
+    return ranked
@@ -0,0 +1,210 @@
+import asyncio
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # only needed for AsyncTransport
+    httpx = None
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "nutrition-check-mad/1.0"
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling an upstream that has been failing.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failed calls and rejects
+    calls for ``reset_timeout`` seconds, then lets a single trial call through
+    (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self):
+        """
+        Raises CircuitOpen if the call may not go ahead. Returns True when the
+        call is the half-open trial; it must end in record_success,
+        record_failure or release_trial.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                raise CircuitOpen("Upstream is failing; not calling it for now")
+            self._trial_in_flight = True
+            return True
+
+    def release_trial(self):
+        """
+        Lets another trial through after one ended without an answer
+        (cancelled, or failed for reasons unrelated to the upstream).
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def backoff_delay(attempt, base, cap):
+    """
+    Full-jitter exponential backoff.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _retry_after(headers, default):
+    value = headers.get("Retry-After")
+    if value and value.isdigit():
+        return float(value)
+    return default
+
+
+class _RetryPolicy:
+    def __init__(self, timeout, retries, backoff, max_backoff, breaker):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+
+
+class Transport(_RetryPolicy):
+    """
+    Connection-pooled ``requests`` session with timeouts, retries on
+    connection errors / 429 / 5xx, and a circuit breaker.
+    """
+
+    def __init__(self, timeout=(3.05, 10.0), retries=2, backoff=0.25, max_backoff=4.0, pool_size=20, breaker=None):
+        super().__init__(timeout, retries, backoff, max_backoff, breaker)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_json(self, url, params=None):
+        trial = self.breaker.before_call()
+        try:
+            res = self._get(url, params)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Otherwise a cancelled trial would keep the circuit open for good
+            if trial:
+                self.breaker.release_trial()
+            raise
+        if res.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            # 4xx other than 429 means upstream is healthy and the request is wrong
+            self.breaker.record_success()
+        res.raise_for_status()
+        return res.json()
+
+    def _get(self, url, params):
+        """Response of the last attempt, retrying connection errors and retryable statuses"""
+        for attempt in range(self.retries + 1):
+            delay = backoff_delay(attempt, self.backoff, self.max_backoff)
+            try:
+                res = self.session.get(url, params=params, timeout=self.timeout)
+            except requests.RequestException:
+                if attempt == self.retries:
+                    raise
+            else:
+                if res.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return res
+                delay = _retry_after(res.headers, delay)
+            time.sleep(min(delay, self.max_backoff))
+
+
+class AsyncTransport(_RetryPolicy):
+    """
+    ``httpx.AsyncClient`` counterpart of :class:`Transport`. The client is
+    bound to the event loop it is first used on.
+    """
+
+    def __init__(self, timeout=(3.05, 10.0), retries=2, backoff=0.25, max_backoff=4.0, pool_size=20, breaker=None):
+        if httpx is None:
+            raise RuntimeError("AsyncTransport requires httpx (pip install httpx)")
+        super().__init__(timeout, retries, backoff, max_backoff, breaker)
+        connect_timeout, read_timeout = timeout
+        self.client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def get_json(self, url, params=None):
+        trial = self.breaker.before_call()
+        try:
+            res = await self._get(url, params)
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Otherwise a cancelled trial would keep the circuit open for good
+            if trial:
+                self.breaker.release_trial()
+            raise
+        if res.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            # 4xx other than 429 means upstream is healthy and the request is wrong
+            self.breaker.record_success()
+        res.raise_for_status()
+        return res.json()
+
+    async def _get(self, url, params):
+        """Response of the last attempt, retrying connection errors and retryable statuses"""
+        for attempt in range(self.retries + 1):
+            delay = backoff_delay(attempt, self.backoff, self.max_backoff)
+            try:
+                res = await self.client.get(url, params=params)
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+            else:
+                if res.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return res
+                delay = _retry_after(res.headers, delay)
+            await asyncio.sleep(min(delay, self.max_backoff))
+
+    async def aclose(self):
+        await self.client.aclose()
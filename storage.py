@@ -0,0 +1,496 @@
+"""
+Storage backends for the Animal & File API.
+
+The API used to keep everything in a single ``data.json`` that was parsed and
+rewritten in full on every request.  The default backend now keeps records in
+SQLite (WAL mode), so an append is a single-row insert, readers don't reparse
+the whole history and concurrent writers (threads or uvicorn workers) are
+serialized by SQLite's own locking.  The JSON file is still available as a
+backend and is imported into SQLite once on first start.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+ITER_PAGE_SIZE = 500
+
+ANIMAL_FIELDS = ("animal", "timestamp")
+FILE_FIELDS = ("filename", "size", "content_type", "timestamp", "path", "sha256")
+
+# Recomputes the materialized /stats aggregates from the full history
+REBUILD_STATS_SQL = """
+    DELETE FROM animal_counts;
+    DELETE FROM counters;
+    INSERT INTO animal_counts (animal, count) SELECT animal, COUNT(*) FROM animals GROUP BY animal ORDER BY MIN(id);
+    INSERT INTO counters (name, value) SELECT 'animal_selections', COUNT(*) FROM animals;
+    INSERT INTO counters (name, value) SELECT 'files', COUNT(*) FROM files;
+    INSERT INTO counters (name, value) SELECT 'file_bytes', COALESCE(SUM(size), 0) FROM files;
+"""
+
+# Each entry upgrades the schema by one version (tracked in PRAGMA user_version).
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS animals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        animal TEXT NOT NULL,
+        timestamp TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS animals_timestamp ON animals(timestamp);
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        content_type TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        path TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS files_filename ON files(filename);
+    CREATE INDEX IF NOT EXISTS files_timestamp ON files(timestamp);
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE files ADD COLUMN sha256 TEXT;
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS files_path ON files(path);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS animal_counts (
+        animal TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    """ + REBUILD_STATS_SQL,
+]
+
+
+def empty_data():
+    return {"animals": [], "files": []}
+
+
+def compute_stats(animals, files):
+    return {
+        "total_animal_selections": len(animals),
+        "animal_breakdown": dict(Counter(entry["animal"] for entry in animals)),
+        "total_files_uploaded": len(files),
+        "total_file_size_bytes": sum(f["size"] for f in files)
+    }
+
+
+def _in_range(timestamp, since, until):
+    return (not since or timestamp >= since) and (not until or timestamp < until)
+
+
+class JsonStorage:
+    """Legacy backend: the whole history lives in one JSON document."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+
+    def load(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    return json.load(f)
+            return empty_data()
+
+    def save(self, data):
+        data["stats"] = compute_stats(data["animals"], data["files"])
+        self._write(data)
+
+    def _write(self, data):
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def _stats(self, data):
+        if "stats" not in data:
+            data["stats"] = compute_stats(data["animals"], data["files"])
+        return data["stats"]
+
+    def add_animal(self, entry):
+        self.add_animals([entry])
+
+    def add_animals(self, entries):
+        with self._lock:
+            data = self.load()
+            stats = self._stats(data)
+            data["animals"].extend(entries)
+            stats["total_animal_selections"] += len(entries)
+            breakdown = stats["animal_breakdown"]
+            for animal, count in Counter(entry["animal"] for entry in entries).items():
+                breakdown[animal] = breakdown.get(animal, 0) + count
+            self._write(data)
+
+    def add_file(self, info, place=None):
+        with self._lock:
+            data = self.load()
+            if place:
+                place()
+            stats = self._stats(data)
+            data["files"].append(info)
+            stats["total_files_uploaded"] += 1
+            stats["total_file_size_bytes"] += info["size"]
+            self._write(data)
+
+    def _iter(self, key, after, since, until, limit):
+        # Positions stand in for ids here, so file cursors shift after a delete
+        count = 0
+        for record_id, record in enumerate(self.load()[key], start=1):
+            if limit is not None and count >= limit:
+                return
+            if (after and record_id <= after) or not _in_range(record["timestamp"], since, until):
+                continue
+            count += 1
+            yield record_id, record
+
+    def iter_animals(self, after=None, since=None, until=None, limit=None):
+        return self._iter("animals", after, since, until, limit)
+
+    def iter_files(self, after=None, since=None, until=None, limit=None):
+        return self._iter("files", after, since, until, limit)
+
+    def latest_file(self, filename):
+        for info in reversed(self.load()["files"]):
+            if info["filename"] == filename:
+                return info
+        return None
+
+    def animals(self):
+        return self.load()["animals"]
+
+    def files(self):
+        return self.load()["files"]
+
+    def remove_files(self, filename, release=None):
+        with self._lock:
+            data = self.load()
+            kept = [f for f in data["files"] if f["filename"] != filename]
+            removed = [f for f in data["files"] if f["filename"] == filename]
+            stats = self._stats(data)
+            data["files"] = kept
+            stats["total_files_uploaded"] -= len(removed)
+            stats["total_file_size_bytes"] -= sum(f["size"] for f in removed)
+            self._write(data)
+            if release:
+                still_referenced = {f["path"] for f in kept}
+                for path in {f["path"] for f in removed} - still_referenced:
+                    release(path)
+            return len(removed)
+
+    def stats(self):
+        return self._stats(self.load())
+
+    def rebuild_stats(self):
+        with self._lock:
+            data = self.load()
+            self.save(data)
+            return data["stats"]
+
+    def close(self):
+        pass
+
+
+class SQLiteStorage:
+    """Append-only SQLite store in WAL mode.
+
+    A single connection is shared by the process and guarded by a lock;
+    ``busy_timeout`` makes writers from other worker processes wait for the
+    database lock instead of failing.
+    """
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._migrate()
+        if legacy_json:
+            self.import_json(legacy_json)
+
+    def _migrate(self):
+        with self._lock:
+            for number, script in enumerate(MIGRATIONS, start=1):
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Re-read under the write lock: another worker may have migrated meanwhile
+                    if self._conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                        self._conn.execute("COMMIT")
+                        continue
+                    self._run_script(self._conn, script)
+                    self._conn.execute(f"PRAGMA user_version={number}")
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def import_json(self, json_path):
+        """One-time import of a legacy ``data.json``; returns True if rows were imported."""
+        if not os.path.exists(json_path):
+            return False
+        marker = os.path.abspath(json_path)
+        with self._transaction() as conn:
+            done = conn.execute("SELECT 1 FROM meta WHERE key = ?", ("json_migrated:" + marker,)).fetchone()
+            if done:
+                return False
+            with open(json_path, "r") as f:
+                data = json.load(f)
+            self._insert_animals(conn, data.get("animals", []))
+            self._insert_files(conn, data.get("files", []))
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", ("json_migrated:" + marker, "1"))
+        os.replace(json_path, json_path + ".migrated")
+        return True
+
+    @staticmethod
+    def _bump(conn, table, key_column, value_column, key, delta):
+        # INSERT OR IGNORE + UPDATE rather than UPSERT: the deploy targets ship SQLite < 3.24
+        conn.execute(f"INSERT OR IGNORE INTO {table} ({key_column}, {value_column}) VALUES (?, 0)", (key,))
+        conn.execute(f"UPDATE {table} SET {value_column} = {value_column} + ? WHERE {key_column} = ?", (delta, key))
+
+    def _bump_counter(self, conn, name, delta):
+        self._bump(conn, "counters", "name", "value", name, delta)
+
+    def _insert_animals(self, conn, entries):
+        conn.executemany(
+            "INSERT INTO animals (animal, timestamp) VALUES (?, ?)",
+            [(e["animal"], e["timestamp"]) for e in entries],
+        )
+        for animal, count in Counter(e["animal"] for e in entries).items():
+            self._bump(conn, "animal_counts", "animal", "count", animal, count)
+        self._bump_counter(conn, "animal_selections", len(entries))
+
+    def _insert_files(self, conn, infos):
+        conn.executemany(
+            "INSERT INTO files (filename, size, content_type, timestamp, path, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+            # records written before uploads were hashed have no sha256
+            [tuple(info.get(field) for field in FILE_FIELDS) for info in infos],
+        )
+        self._bump_counter(conn, "files", len(infos))
+        self._bump_counter(conn, "file_bytes", sum(info["size"] for info in infos))
+
+    @staticmethod
+    def _run_script(conn, script):
+        for statement in script.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+    def load(self):
+        return {"animals": self.animals(), "files": self.files()}
+
+    def save(self, data):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM animals")
+            conn.execute("DELETE FROM files")
+            self._insert_animals(conn, data["animals"])
+            self._insert_files(conn, data["files"])
+            self._run_script(conn, REBUILD_STATS_SQL)
+
+    def add_animal(self, entry):
+        self.add_animals([entry])
+
+    def add_animals(self, entries):
+        """Append many selections in a single transaction."""
+        with self._transaction() as conn:
+            self._insert_animals(conn, entries)
+
+    def add_file(self, info, place=None):
+        """Insert a file record; ``place()`` runs inside the write transaction."""
+        with self._transaction() as conn:
+            if place:
+                place()
+            self._insert_files(conn, [info])
+
+    def _iter(self, table, fields, after, since, until, limit):
+        """Yield ``(id, record)`` in id order, reading one page at a time.
+
+        The lock is only held while a page is fetched, so a slow consumer
+        (e.g. a streaming response) never blocks writers.
+        """
+        clauses, params = ["id > ?"], []
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        query = f"SELECT id, {', '.join(fields)} FROM {table} WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?"
+        cursor, remaining = after or 0, limit
+        while remaining is None or remaining > 0:
+            page_size = ITER_PAGE_SIZE if remaining is None else min(ITER_PAGE_SIZE, remaining)
+            with self._lock:
+                rows = self._conn.execute(query, [cursor] + params + [page_size]).fetchall()
+            for row in rows:
+                yield row[0], {field: row[field] for field in fields}
+            if len(rows) < page_size:
+                return
+            cursor = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def iter_animals(self, after=None, since=None, until=None, limit=None):
+        return self._iter("animals", ANIMAL_FIELDS, after, since, until, limit)
+
+    def iter_files(self, after=None, since=None, until=None, limit=None):
+        return self._iter("files", FILE_FIELDS, after, since, until, limit)
+
+    def latest_file(self, filename):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(FILE_FIELDS)} FROM files WHERE filename = ? ORDER BY id DESC LIMIT 1", (filename,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def animals(self):
+        return [record for _, record in self.iter_animals()]
+
+    def files(self):
+        return [record for _, record in self.iter_files()]
+
+    def remove_files(self, filename, release=None):
+        """Delete every record for ``filename``.
+
+        ``release(path)`` is called, inside the write transaction, for each
+        stored path that no remaining record refers to.
+        """
+        with self._transaction() as conn:
+            paths = [row[0] for row in conn.execute("SELECT DISTINCT path FROM files WHERE filename = ?", (filename,))]
+            size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM files WHERE filename = ?", (filename,)).fetchone()[0]
+            removed = conn.execute("DELETE FROM files WHERE filename = ?", (filename,)).rowcount
+            self._bump_counter(conn, "files", -removed)
+            self._bump_counter(conn, "file_bytes", -size)
+            if release:
+                for path in paths:
+                    if not conn.execute("SELECT 1 FROM files WHERE path = ? LIMIT 1", (path,)).fetchone():
+                        release(path)
+            return removed
+
+    def stats(self):
+        """Materialized aggregates; cost doesn't depend on history size."""
+        with self._lock:
+            breakdown = self._conn.execute("SELECT animal, count FROM animal_counts WHERE count > 0 ORDER BY rowid").fetchall()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "total_animal_selections": counters.get("animal_selections", 0),
+            "animal_breakdown": {row["animal"]: row["count"] for row in breakdown},
+            "total_files_uploaded": counters.get("files", 0),
+            "total_file_size_bytes": counters.get("file_bytes", 0)
+        }
+
+    def rebuild_stats(self):
+        with self._transaction() as conn:
+            self._run_script(conn, REBUILD_STATS_SQL)
+        return self.stats()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self._lock.release()
+            raise
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._lock.release()
+        return False
+
+
+class WriteBehindBuffer:
+    """Coalesces appends into one ``write(batch)`` call per ``window`` seconds.
+
+    Appends return as soon as they are queued, so up to ``window`` seconds of
+    acknowledged records can be lost if the process dies.  A flush also
+    happens early once ``max_pending`` records are queued, on ``flush()`` and
+    on ``close()``.  A failed write is logged and retried on the next flush.
+    """
+
+    def __init__(self, write, window, max_pending=1000):
+        self._write = write
+        self.window = window
+        self.max_pending = max_pending
+        self._pending = []
+        self._closed = False
+        self._cond = threading.Condition()
+        # Keeps batches in order when a foreground flush races the flusher thread
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def extend(self, items):
+        with self._cond:
+            self._pending.extend(items)
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            except Exception:
+                with self._cond:
+                    self._pending[:0] = batch
+                raise
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.max_pending, self.window)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed; will retry")
+            if closed:
+                return
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+def open_storage(backend, json_path, db_path):
+    if backend == "json":
+        return JsonStorage(json_path)
+    if backend == "sqlite":
+        return SQLiteStorage(db_path, legacy_json=json_path)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,252 @@
+"""
+Bounded-memory upload handling for the Animal & File API.
+
+Uploads are written to a temp file in fixed-size chunks while their size and
+SHA-256 are tracked incrementally, then renamed into a content-addressed blob
+store, so identical uploads share one file on disk.  Resumable uploads keep a ``.part`` file plus a small JSON sidecar per
+session so a client can continue from the last acknowledged offset, even
+after a restart or on another worker.  Appends and finishing lock the part
+file with ``flock`` so workers never interleave writes to one session.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; sessions are then only safe within one process
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, expected):
+        super().__init__(f"Upload offset must be {expected}")
+        self.expected = expected
+
+
+def _fsync_close(f):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+class ChunkedUpload:
+    """Streams one upload into a temp file next to its final location."""
+
+    def __init__(self, directory, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def write(self, chunk):
+        if self.size + len(chunk) > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds the {self.max_bytes} byte limit")
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        _fsync_close(self._file)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+@contextmanager
+def _locked_part(part_path):
+    """The session's part file, opened for writing and locked against other processes."""
+    try:
+        f = open(part_path, "r+b")
+    except FileNotFoundError:
+        raise UploadNotFound()
+    with f:
+        if fcntl is not None:
+            # released when the file is closed
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        yield f
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadSessions:
+    """Resumable upload sessions stored as ``<id>.part`` + ``<id>.json``.
+
+    Sessions untouched for ``ttl`` seconds are deleted by :meth:`sweep`, which
+    :meth:`create` runs at most every ``sweep_interval`` seconds.
+    """
+
+    def __init__(self, directory, max_bytes, ttl=24 * 3600, sweep_interval=3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = min(sweep_interval, ttl)
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, upload_id):
+        # ids are generated by create(); anything else could be a path traversal attempt
+        try:
+            upload_id = uuid.UUID(hex=upload_id).hex
+        except ValueError:
+            return None, None
+        base = os.path.join(self.directory, upload_id)
+        return base + ".part", base + ".json"
+
+    def create(self, filename, size, content_type):
+        if not isinstance(size, int) or size < 0:
+            raise ValueError("Upload size must be a non-negative integer")
+        if size > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds the {self.max_bytes} byte limit")
+        self._maybe_sweep()
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        open(part_path, "wb").close()
+        meta = {"upload_id": upload_id, "filename": filename, "size": size, "content_type": content_type}
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        return dict(meta, offset=0)
+
+    def get(self, upload_id):
+        part_path, meta_path = self._paths(upload_id)
+        if not meta_path:
+            return None
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            meta["offset"] = os.path.getsize(part_path)
+        except FileNotFoundError:
+            # finished, cancelled or expired meanwhile
+            return None
+        return meta
+
+    def append(self, upload_id, offset, chunk):
+        """Append ``chunk`` at ``offset``; returns the new offset."""
+        part_path, _ = self._paths(upload_id)
+        if not part_path:
+            raise UploadNotFound()
+        with self._lock, _locked_part(part_path) as f:
+            session = self.get(upload_id)
+            if session is None:
+                raise UploadNotFound()
+            current = session["offset"]
+            if offset != current:
+                raise OffsetMismatch(current)
+            if current + len(chunk) > session["size"]:
+                raise UploadTooLarge("Chunk runs past the declared upload size")
+            f.seek(0, os.SEEK_END)
+            f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        return current + len(chunk)
+
+    def finish(self, upload_id):
+        """Close a complete session; returns the path of its data and its SHA-256.
+
+        Exactly one caller wins, across threads and worker processes: the
+        sidecar is claimed by renaming it, and everyone else gets UploadNotFound.
+        """
+        part_path, meta_path = self._paths(upload_id)
+        if not meta_path:
+            raise UploadNotFound()
+        claimed_path = meta_path + ".finishing"
+        # Holding the part lock means no append is still writing to it
+        with self._lock, _locked_part(part_path):
+            try:
+                os.rename(meta_path, claimed_path)
+            except FileNotFoundError:
+                raise UploadNotFound()
+        sha256 = hash_file(part_path)
+        os.remove(claimed_path)
+        return part_path, sha256
+
+    def discard(self, upload_id):
+        for path in self._paths(upload_id):
+            if path:
+                remove_if_exists(path)
+
+    def _maybe_sweep(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+        self.sweep()
+
+    def sweep(self):
+        """Delete sessions none of whose files changed for ``ttl`` seconds; returns how many were removed."""
+        cutoff = time.time() - self.ttl
+        sessions = {}  # upload id -> ([paths], newest mtime)
+        for entry in os.scandir(self.directory):
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            paths, newest = sessions.get(entry.name.split(".")[0], ([], 0))
+            paths.append(entry.path)
+            sessions[entry.name.split(".")[0]] = (paths, max(newest, mtime))
+        removed = 0
+        for paths, newest in sessions.values():
+            if newest < cutoff:
+                for path in paths:
+                    remove_if_exists(path)
+                removed += 1
+        return removed
+
+
+class BlobStore:
+    """Content-addressed files sharded as ``<root>/ab/cd/<sha256>``."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def put(self, temp_path, sha256):
+        """Move ``temp_path`` into the store, or drop it if the blob already exists."""
+        path = self.path(sha256)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        return path
+
+
+def remove_if_exists(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass